@@ -305,6 +305,14 @@ class Parameters:
             fixed-format roadway network. Default:
             ::
                 r"tests/scratch/make_complete_network_from_fixed_width_file.s
+        roadway_cache_dir (str): Folder for caching base roadway networks
+            prepared for project cards, or None to not cache them. Default:
+            ::
+                None
+        transit_cache_dir (str): Folder for caching the parsed lines of cube
+            line files, or None to not cache them. Default:
+            ::
+                None
 
 
 
@@ -623,6 +631,9 @@ class Parameters:
         self.output_dir = os.path.join(self.scratch_location)
         self.output_epsg = 26915
 
+        self.roadway_cache_dir = None
+        self.transit_cache_dir = None
+
         """
         Create all the possible headway variable combinations based on the cube time periods setting
         """
@@ -1,11 +1,16 @@
+import glob
+import io
 import json
+import multiprocessing
 import os
-import re
-from typing import Any, Dict, Optional
+from collections import Counter
+from typing import Any, Dict, List, Optional
 
+import numpy as np
 import pandas as pd
 from pandas import DataFrame
 import geopandas as gpd
+import yaml
 
 from network_wrangler import ProjectCard
 from network_wrangler import RoadwayNetwork
@@ -14,6 +19,54 @@ from .transit import CubeTransit, StandardTransit
 from .logger import WranglerLogger
 from .parameters import Parameters
 from .roadway import ModelRoadwayNetwork
+from .util import (
+    cache_key_hash,
+    read_cache_pickle,
+    update_hash_with_file,
+    write_cache_pickle,
+)
+
+
+class _CardDumper(getattr(yaml, "CDumper", yaml.Dumper)):
+    """
+    YAML dumper for streamed project cards. Numpy scalars are written as
+    python scalars, and repeated objects are written in full rather than
+    as aliases because each part of the card is dumped on its own.
+    """
+
+    def ignore_aliases(self, data):
+        return True
+
+
+_CardDumper.add_multi_representer(
+    np.generic, lambda dumper, data: dumper.represent_data(data.item())
+)
+
+# base roadway network shared by the worker processes of Project.create_projects
+_batch_base_roadway_network = None
+_batch_parameters = {}
+
+
+def _init_batch_worker(base_roadway_network, parameters):
+    global _batch_base_roadway_network, _batch_parameters
+    _batch_base_roadway_network = base_roadway_network
+    _batch_parameters = parameters
+
+
+def _write_batch_project_card(job):
+    roadway_changes_file, card_filename, project_name = job
+    roadway_changes = Project.read_roadway_changes(
+        roadway_changes_file, parameters=_batch_parameters
+    )
+    project = Project(
+        roadway_changes=roadway_changes,
+        base_roadway_network=_batch_base_roadway_network,
+        evaluate=True,
+        project_name=project_name,
+        parameters=_batch_parameters,
+    )
+    project.write_project_card(card_filename)
+    return card_filename
 
 
 class Project(object):
@@ -40,6 +93,9 @@ class Project(object):
             the project name will be if none is set.
         STATIC_VALUES: a class-level constant which defines values that
             are not evaluated when assessing changes.
+        BASE_ROADWAY_CACHE_VERSION: a class-level constant that is part of the
+            key of cached base roadway networks. Increment it when the
+            preparation of the base roadway network changes.
         card_data (dict):  {"project": <project_name>, "changes": <list of change dicts>}
         roadway_changes (DataFrame):  pandas dataframe of CUBE roadway changes.
         transit_changes (CubeTransit):
@@ -59,6 +115,18 @@ class Project(object):
         "centroidconnect",
     ]
 
+    BASE_ROADWAY_CACHE_VERSION = 2
+
+    # parameters that don't change how the base roadway network is prepared
+    _BASE_ROADWAY_CACHE_IGNORE = [
+        "base_dir",
+        "data_file_location",
+        "settings_location",
+        "scratch_location",
+        "roadway_cache_dir",
+        "transit_cache_dir",
+    ]
+
     def __init__(
         self,
         roadway_changes: Optional[DataFrame] = None,
@@ -76,6 +144,12 @@ class Project(object):
         self.card_data = Dict[str, Dict[str, Any]]
 
         self.roadway_changes = roadway_changes
+        if base_roadway_network is not None and not isinstance(
+            base_roadway_network, ModelRoadwayNetwork
+        ):
+            base_roadway_network = ModelRoadwayNetwork.from_RoadwayNetwork(
+                base_roadway_network, parameters=parameters
+            )
         self.base_roadway_network = base_roadway_network
         self.base_transit_network = base_transit_network
         self.build_transit_network = build_transit_network
@@ -91,19 +165,185 @@ class Project(object):
         if evaluate:
             self.evaluate_changes()
 
-    def write_project_card(self, filename):
+    @property
+    def card_data(self):
+        """
+        Project card data, {"project": <project_name>, "changes": <list of change dicts>}.
+
+        After evaluate_changes, it is made from the evaluated changes when it is
+        first used.
+        """
+        if self._card_data is None and self._card_changes is not None:
+            self._card_data = {
+                "project": self.project_name,
+                "changes": [
+                    Project._change_records(change) for change in self._card_changes
+                ],
+            }
+            self._card_changes = None
+        return self._card_data
+
+    @card_data.setter
+    def card_data(self, card_data):
+        self._card_data = card_data
+        self._card_changes = None
+
+    def write_project_card(self, filename, stream: bool = False, compact: bool = False):
         """
         Writes project cards.
 
         Args:
             filename (str): File path to output .yml
+            stream (bool): If True, the card is written change by change, and the
+                links and nodes of "New Roadway" changes and the links of "Roadway
+                Deletion" changes record by record, instead of being serialized
+                all at once. If card_data hasn't been used yet, the records are
+                written from the evaluated changes without making card_data, so
+                memory doesn't grow with the number of added or deleted links.
+            compact (bool): If True, each "New Roadway" link and node is written on
+                a single line and "Roadway Deletion" links as a single list.
+                Implies stream.
 
         Returns:
             None
         """
-        ProjectCard(self.card_data).write(filename)
+        if stream or compact:
+            with open(filename, "w") as f:
+                for text in self._project_card_yaml(compact=compact):
+                    f.write(text)
+        else:
+            ProjectCard(self.card_data).write(filename)
         WranglerLogger.info("Wrote project card to: {}".format(filename))
 
+    def _project_card_yaml(self, compact: bool = False):
+        """
+        Generates the YAML text of the project card in pieces, with the same
+        keys and layout as ProjectCard.write.
+
+        If card_data hasn't been made yet, the links and nodes of "New Roadway"
+        changes and the links of "Roadway Deletion" changes are written one
+        record at a time from the DataFrames and Series they were evaluated to,
+        without making card_data.
+
+        Args:
+            compact (bool): If True, write "New Roadway" links and nodes and
+                "Roadway Deletion" links in flow style.
+
+        Yields:
+            Pieces of YAML text.
+        """
+
+        def _dump(data, flow=False):
+            return yaml.dump(
+                data,
+                Dumper=_CardDumper,
+                default_flow_style=None if flow else False,
+                width=2 ** 30 if flow else 80,
+            )
+
+        def _indent(text, first_prefix, prefix):
+            lines = text.splitlines(True)
+            return first_prefix + lines[0] + "".join(prefix + l for l in lines[1:])
+
+        def _records(value):
+            if isinstance(value, DataFrame):
+                columns = list(value.columns)
+                for row in value.itertuples(index=False, name=None):
+                    yield dict(zip(columns, row))
+            else:
+                yield from value
+
+        def _is_records(value):
+            if isinstance(value, DataFrame):
+                return len(value) > 0
+            return isinstance(value, list) and value and isinstance(value[0], dict)
+
+        if self._card_changes is not None:
+            card = {"project": self.project_name, "changes": self._card_changes}
+        else:
+            card = dict(self.card_data)
+        card["valid"] = False
+
+        # ProjectCard.write dumps the card with sorted keys
+        for key, value in sorted(card.items()):
+            if key != "changes" or not value:
+                yield _dump({key: Project._change_records(value)})
+                continue
+
+            yield "changes:\n"
+            for change in value:
+                roadway_add_or_delete = change.get("category") in [
+                    "New Roadway",
+                    "Roadway Deletion",
+                ] or (set(change) <= {"links", "nodes"})
+
+                if not roadway_add_or_delete:
+                    yield _dump([Project._change_records(change)])
+                    continue
+
+                for i, (change_key, change_value) in enumerate(sorted(change.items())):
+                    prefix = "- " if i == 0 else "  "
+                    if _is_records(change_value):
+                        yield prefix + change_key + ":\n"
+                        for record in _records(change_value):
+                            yield _indent(_dump([record], flow=compact), "  ", "  ")
+                    elif isinstance(change_value, dict) and any(
+                        isinstance(v, pd.Series) and len(v)
+                        for v in change_value.values()
+                    ):
+                        yield prefix + change_key + ":\n"
+                        for sub_key, sub_value in sorted(change_value.items()):
+                            yield from Project._list_yaml(
+                                sub_key, sub_value, _dump, compact
+                            )
+                    else:
+                        change_value = Project._change_records(change_value)
+                        flow = compact and isinstance(change_value, (dict, list))
+                        yield _indent(
+                            _dump({change_key: change_value}, flow=flow),
+                            prefix,
+                            "  ",
+                        )
+
+    @staticmethod
+    def _list_yaml(key, values, dump, compact: bool = False, chunksize: int = 10000):
+        """
+        Generates the YAML text of a list of scalars under a key of a change,
+        e.g. the model_link_id of the links of a "Roadway Deletion", a chunk
+        of values at a time.
+
+        Args:
+            key (str): Key of the list.
+            values (list or Series): Scalar values of the list.
+            dump: function that dumps data to YAML, in flow style if its
+                flow argument is True.
+            compact (bool): If True, write the list in flow style.
+            chunksize (int): Number of values to dump at a time.
+
+        Yields:
+            Pieces of YAML text.
+        """
+        if not isinstance(values, (list, pd.Series)) or not len(values):
+            text = dump({key: Project._change_records(values)}, flow=compact)
+            yield "    " + text.rstrip("\n").replace("\n", "\n    ") + "\n"
+            return
+
+        if isinstance(values, pd.Series):
+            values = values.values
+        chunks = (
+            list(values[i : i + chunksize]) for i in range(0, len(values), chunksize)
+        )
+        if compact:
+            yield "    " + key + ": ["
+            for i, chunk in enumerate(chunks):
+                yield (", " if i else "") + dump(chunk, flow=True).strip()[1:-1]
+            yield "]\n"
+        else:
+            yield "    " + key + ":\n"
+            for chunk in chunks:
+                text = dump(chunk)
+                yield "    " + text.rstrip("\n").replace("\n", "\n    ") + "\n"
+
     @staticmethod
     def create_project(
         roadway_log_file: Optional[str] = None,
@@ -143,7 +383,9 @@ class Project(object):
         """
 
         if base_transit_source:
-            base_transit_network = CubeTransit.create_from_cube(base_transit_source)
+            base_transit_network = CubeTransit.create_from_cube(
+                base_transit_source, parameters=parameters
+            )
             WranglerLogger.debug(
                 "Base network has {} lines".format(len(base_transit_network.lines))
             )
@@ -164,7 +406,9 @@ class Project(object):
             raise ValueError(msg)
         if build_transit_source:
             WranglerLogger.debug("build")
-            build_transit_network = CubeTransit.create_from_cube(build_transit_source)
+            build_transit_network = CubeTransit.create_from_cube(
+                build_transit_source, parameters=parameters
+            )
             WranglerLogger.debug(
                 "Build network has {} lines".format(len(build_transit_network.lines))
             )
@@ -204,14 +448,17 @@ class Project(object):
             WranglerLogger.error(msg)
             raise ValueError(msg)
         if roadway_log_file:
-            roadway_changes = Project.read_logfile(roadway_log_file)
+            roadway_changes = Project.read_roadway_changes(
+                roadway_log_file, file_type="log", parameters=parameters
+            )
         elif roadway_shp_file:
-            roadway_changes = gpd.read_file(roadway_shp_file)
-            roadway_changes = DataFrame(roadway_changes.drop("geometry", axis = 1))
-            roadway_changes["model_node_id"] = 0
+            roadway_changes = Project.read_roadway_changes(
+                roadway_shp_file, file_type="shp", parameters=parameters
+            )
         elif roadway_csv_file:
-            roadway_changes = pd.read_csv(roadway_csv_file)
-            roadway_changes["model_node_id"] = 0
+            roadway_changes = Project.read_roadway_changes(
+                roadway_csv_file, file_type="csv", parameters=parameters
+            )
         else:
             msg = "No roadway changes given or processed."
             WranglerLogger.info(msg)
@@ -222,17 +469,9 @@ class Project(object):
             WranglerLogger.error(msg)
             raise ValueError(msg)
         if base_roadway_dir:
-            base_roadway_network = ModelRoadwayNetwork.read(
-                os.path.join(base_roadway_dir, "link.json"),
-                os.path.join(base_roadway_dir, "node.geojson"),
-                os.path.join(base_roadway_dir, "shape.geojson"),
-                True,
-            )
-            base_roadway_network.create_calculated_variables()
-            base_roadway_network.calculate_distance(overwrite = True)
-            base_roadway_network.fill_na()
-            base_roadway_network.convert_int()
-            base_roadway_network.split_properties_by_time_period_and_category()
+            base_roadway_network = Project.read_base_roadway_network(
+                base_roadway_dir, parameters=parameters
+            )
         else:
             msg = "No base roadway network."
             WranglerLogger.info(msg)
@@ -252,50 +491,512 @@ class Project(object):
         return project
 
     @staticmethod
-    def read_logfile(logfilename: str) -> DataFrame:
+    def create_projects(
+        roadway_changes_files: List[str],
+        output_dir: str,
+        base_roadway_dir: Optional[str] = None,
+        base_roadway_network: Optional[RoadwayNetwork] = None,
+        project_names: Optional[List[str]] = None,
+        n_workers: int = 1,
+        parameters={},
+    ) -> List[str]:
         """
-        Reads a Cube log file and returns a dataframe of roadway_changes
+        Writes a roadway project card for each of many roadway change files
+        (Cube log files, shape files or csv files) compared to the same base
+        roadway network.
+
+        The base roadway network is read and prepared once and shared with
+        worker processes when they start, so it isn't sent to the workers
+        again for each change file.
+
+        .. highlight:: python
+
+        Typical usage example:
+        ::
+            card_files = Project.create_projects(
+                glob.glob(os.path.join(CUBE_DIR, "*.log")),
+                SCRATCH_DIR,
+                base_roadway_dir=ROADWAY_DIR,
+            )
 
         Args:
-            logfilename (str): File path to CUBE logfile.
+            roadway_changes_files (list): File paths to the roadway change files.
+            output_dir (str): Folder path to write the project cards to.
+            base_roadway_dir (str): Folder path to base roadway network.
+            base_roadway_network (RoadwayNetwork): Base roadway network object,
+                already prepared for comparison with the roadway changes.
+            project_names (list): Project name for each roadway change file, which
+                is also the project card file name. Defaults to the change file
+                names without extension. Names have to be unique.
+            n_workers (int): Number of worker processes. If 1, the project cards are
+                written in this process. Each worker process holds its own copy of
+                the base roadway network, so peak memory grows with the number of
+                workers. On platforms that start worker processes by spawning them
+                (e.g. Windows), a calling script has to be guarded by
+                ``if __name__ == "__main__":`` when n_workers is more than 1.
+            parameters (dict): Lasso parameters.
 
         Returns:
-            A DataFrame reprsentation of the log file.
+            A list of the project card file paths, in the order of roadway_changes_files.
         """
-        WranglerLogger.info("Reading logfile: {}".format(logfilename))
-        with open(logfilename) as f:
-            content = f.readlines()
+        if project_names is None:
+            project_names = [
+                os.path.splitext(os.path.basename(f))[0] for f in roadway_changes_files
+            ]
+        if len(project_names) != len(roadway_changes_files):
+            msg = "Number of project names ({}) doesn't match number of roadway change files ({})".format(
+                len(project_names), len(roadway_changes_files)
+            )
+            WranglerLogger.error(msg)
+            raise ValueError(msg)
+        name_counts = Counter(os.path.normcase(name) for name in project_names)
+        duplicate_names = sorted(
+            set(name for name in project_names if name_counts[os.path.normcase(name)] > 1)
+        )
+        if duplicate_names:
+            msg = "Project names must be unique because each names its project card file, but got duplicates: {}. Pass 'project_names' to name them.".format(
+                duplicate_names
+            )
+            WranglerLogger.error(msg)
+            raise ValueError(msg)
 
-        # (content[0].startswith("HighwayLayerLogX")):
-        if not content[0].startswith("HighwayLayerLogX"):
-            WranglerLogger.info("Returning an empty dataframe")
-            return DataFrame()
+        if base_roadway_network and base_roadway_dir:
+            msg = "Method takes only one of 'base_roadway_network' and 'base_roadway_dir' but both given"
+            WranglerLogger.error(msg)
+            raise ValueError(msg)
+        if base_roadway_dir:
+            base_roadway_network = Project.read_base_roadway_network(
+                base_roadway_dir, parameters=parameters
+            )
+        if base_roadway_network is None:
+            msg = "Method requires one of 'base_roadway_network' and 'base_roadway_dir'"
+            WranglerLogger.error(msg)
+            raise ValueError(msg)
+        if not isinstance(base_roadway_network, ModelRoadwayNetwork):
+            base_roadway_network = ModelRoadwayNetwork.from_RoadwayNetwork(
+                base_roadway_network, parameters=parameters
+            )
+
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+
+        jobs = [
+            (f, os.path.join(output_dir, name + ".yml"), name)
+            for f, name in zip(roadway_changes_files, project_names)
+        ]
+
+        n_workers = max(1, min(n_workers, len(jobs)))
+
+        WranglerLogger.info(
+            "Writing {} project cards with {} worker(s)".format(len(jobs), n_workers)
+        )
 
-        NodeLines = [x.strip() for x in content if x.startswith("N")]
+        if n_workers == 1:
+            _init_batch_worker(base_roadway_network, parameters)
+            try:
+                return [_write_batch_project_card(job) for job in jobs]
+            finally:
+                _init_batch_worker(None, {})
 
-        LinkLines = [x.strip() for x in content if x.startswith("L")]
+        with multiprocessing.Pool(
+            processes=n_workers,
+            initializer=_init_batch_worker,
+            initargs=(base_roadway_network, parameters),
+        ) as pool:
+            return pool.map(_write_batch_project_card, jobs, chunksize=1)
 
-        linkcol_names = ["OBJECT", "OPERATION", "GROUP"] + LinkLines[0].split(",")[1:]
+    @staticmethod
+    def read_base_roadway_network(
+        base_roadway_dir: str, parameters={}, cache_dir: Optional[str] = None
+    ):
+        """
+        Reads a base roadway network in network standard and prepares it
+        for comparison with roadway changes.
 
-        nodecol_names = ["OBJECT", "OPERATION", "GROUP"] + NodeLines[0].split(",")[1:]
+        If a cache folder is given, the prepared links, nodes and shapes are stored
+        in it under a key that hashes the contents of the network files, the
+        contents of the reference data files in the parameters and the other
+        parameter values, and are read from there the next time the same inputs
+        are used.
+
+        Args:
+            base_roadway_dir (str): Folder path to base roadway network.
+            parameters (dict): Lasso parameters.
+            cache_dir (str): Folder path for cached prepared base roadway networks.
+                Defaults to the roadway_cache_dir parameter.
 
-        link_df = DataFrame(
-            data=[re.split(",|;", x) for x in LinkLines[1:]], columns=linkcol_names
+        Returns:
+            ModelRoadwayNetwork
+        """
+        network_files = [
+            os.path.join(base_roadway_dir, "link.json"),
+            os.path.join(base_roadway_dir, "node.geojson"),
+            os.path.join(base_roadway_dir, "shape.geojson"),
+        ]
+
+        if cache_dir is None:
+            cache_dir = Parameters(**parameters).roadway_cache_dir
+
+        if cache_dir:
+            cache_path = os.path.join(
+                cache_dir,
+                Project._base_roadway_cache_key(network_files, parameters) + ".pkl",
+            )
+            cached_tables = read_cache_pickle(cache_path)
+            if cached_tables is not None:
+                WranglerLogger.info(
+                    "Reading prepared base roadway network from cache: {}".format(
+                        cache_path
+                    )
+                )
+                nodes_df, links_df, shapes_df = cached_tables
+                return ModelRoadwayNetwork(
+                    nodes_df, links_df, shapes_df, parameters=parameters
+                )
+
+        base_roadway_network = ModelRoadwayNetwork.read(
+            *network_files, True, parameters=parameters
         )
+        base_roadway_network.create_calculated_variables()
+        base_roadway_network.calculate_distance(overwrite = True)
+        base_roadway_network.fill_na()
+        base_roadway_network.convert_int()
+        base_roadway_network.split_properties_by_time_period_and_category()
+
+        if cache_dir:
+            Project._write_base_roadway_cache(base_roadway_network, cache_path)
+
+        return base_roadway_network
+
+    @staticmethod
+    def _base_roadway_cache_key(network_files: List[str], parameters={}) -> str:
+        """
+        Creates the cache key of a prepared base roadway network.
+
+        Files are hashed by content, including the sidecar files of shapefiles,
+        so the key doesn't depend on where the inputs are located. The key
+        also includes the python and library versions, see
+        :py:func:`lasso.util.cache_key_hash`.
+
+        Args:
+            network_files (list): File paths to the link, node and shape files.
+            parameters (dict): Lasso parameters.
 
-        node_df = DataFrame(
-            data=[re.split(",|;", x) for x in NodeLines[1:]], columns=nodecol_names
+        Returns:
+            A hex digest string.
+        """
+
+        h = cache_key_hash(Project.BASE_ROADWAY_CACHE_VERSION)
+
+        for filename in network_files:
+            update_hash_with_file(h, filename)
+
+        for name, value in sorted(Parameters(**parameters).__dict__.items()):
+            if name in Project._BASE_ROADWAY_CACHE_IGNORE or name.startswith(
+                "output_"
+            ):
+                continue
+            h.update(name.encode())
+            if isinstance(value, str) and os.path.isfile(value):
+                if value.lower().endswith(".shp"):
+                    filenames = sorted(glob.glob(os.path.splitext(value)[0] + ".*"))
+                else:
+                    filenames = [value]
+                for filename in filenames:
+                    h.update(os.path.splitext(filename)[1].lower().encode())
+                    update_hash_with_file(h, filename)
+            else:
+                h.update(json.dumps(value, sort_keys=True, default=str).encode())
+
+        return h.hexdigest()
+
+    @staticmethod
+    def _write_base_roadway_cache(base_roadway_network, cache_path: str):
+        """
+        Writes the nodes, links and shapes of a prepared base roadway network
+        to a cache file.
+
+        Args:
+            base_roadway_network (ModelRoadwayNetwork): Prepared base roadway network.
+            cache_path (str): File path of the cache entry.
+        """
+        tables = (
+            base_roadway_network.nodes_df,
+            base_roadway_network.links_df,
+            base_roadway_network.shapes_df,
         )
+        if write_cache_pickle(tables, cache_path):
+            WranglerLogger.info(
+                "Wrote prepared base roadway network to cache: {}".format(cache_path)
+            )
+        else:
+            WranglerLogger.warning(
+                "Couldn't write base roadway network cache: {}".format(cache_path)
+            )
+
+    @staticmethod
+    def read_roadway_changes(
+        filename: str, file_type: Optional[str] = None, parameters={}
+    ) -> DataFrame:
+        """
+        Reads roadway changes from a Cube log file, shape file or csv file.
+
+        Args:
+            filename (str): File path to the roadway changes.
+            file_type (str): One of "log", "shp" or "csv". Defaults to the
+                file extension.
+            parameters (dict): Lasso parameters.
+
+        Returns:
+            A DataFrame of roadway changes.
+        """
+        if file_type is None:
+            file_type = os.path.splitext(filename)[1][1:].lower()
+
+        if file_type == "log":
+            roadway_changes = Project.read_logfile(filename, parameters=parameters)
+        elif file_type == "shp":
+            roadway_changes = gpd.read_file(filename)
+            roadway_changes = DataFrame(roadway_changes.drop("geometry", axis = 1))
+            roadway_changes["model_node_id"] = 0
+        elif file_type == "csv":
+            roadway_changes = pd.read_csv(filename)
+            roadway_changes["model_node_id"] = 0
+        else:
+            msg = "Unknown roadway changes file type: {}".format(filename)
+            WranglerLogger.error(msg)
+            raise ValueError(msg)
+
+        return roadway_changes
+
+    @staticmethod
+    def read_logfile(logfilename: str, parameters={}) -> DataFrame:
+        """
+        Reads a Cube log file and returns a dataframe of roadway_changes
+
+        Args:
+            logfilename (str): File path to CUBE logfile.
+            parameters (dict): Lasso parameters, used to find the variable crosswalks
+                and variable types.
+
+        Returns:
+            A DataFrame reprsentation of the log file.
+        """
+        WranglerLogger.info("Reading logfile: {}".format(logfilename))
+
+        node_df_list = []
+        link_df_list = []
+        for node_df, link_df in Project.read_logfile_chunks(
+            logfilename, parameters=parameters
+        ):
+            node_df_list.append(node_df)
+            link_df_list.append(link_df)
+
+        if not link_df_list:
+            WranglerLogger.info("Returning an empty dataframe")
+            return DataFrame()
+
+        link_df = pd.concat(link_df_list, ignore_index=True, sort=False)
+        node_df = pd.concat(node_df_list, ignore_index=True, sort=False)
 
         log_df = pd.concat([link_df, node_df], ignore_index=True, sort=False)
         WranglerLogger.info(
             "Processed {} Node lines and {} Link lines".format(
-                link_df.shape[0], node_df.shape[0]
+                node_df.shape[0], link_df.shape[0]
             )
         )
 
         return log_df
 
+    @staticmethod
+    def read_logfile_chunks(logfilename: str, chunksize: int = 100000, parameters={}):
+        """
+        Reads a Cube log file in chunks so that only a bounded number of
+        records is held in memory at a time.
+
+        Columns are typed from the Node and Link header lines of the log file:
+        columns with a declared width (e.g. NAME[111]) are strings and keep the
+        width in their name, and other columns are read as integers or floats
+        if the network variable they map to through the log_to_net and
+        net_to_dbf crosswalks is one of the int_col or float_col parameters. Any remaining columns are read as strings.
+
+        .. highlight:: python
+
+        Typical usage example:
+        ::
+            for node_df, link_df in Project.read_logfile_chunks(logfilename):
+                ...
+
+        Args:
+            logfilename (str): File path to CUBE logfile.
+            chunksize (int): Maximum number of node and link records per chunk.
+            parameters (dict): Lasso parameters, used to find the variable crosswalks
+                and variable types.
+
+        Yields:
+            A tuple of (node DataFrame, link DataFrame) for each chunk of the log
+            file, either of which may be empty. Nothing is yielded if the file
+            isn't a Cube highway log file.
+        """
+        with open(logfilename) as f:
+            if not f.readline().startswith("HighwayLayerLogX"):
+                return
+
+            parameters = Parameters(**parameters)
+            node_schema = None
+            link_schema = None
+            node_lines = []
+            link_lines = []
+
+            for line in f:
+                if line.startswith("N"):
+                    if node_schema is None:
+                        node_schema = Project._log_schema(line, parameters)
+                    else:
+                        node_lines.append(line)
+                elif line.startswith("L"):
+                    if link_schema is None:
+                        link_schema = Project._log_schema(line, parameters)
+                    else:
+                        link_lines.append(line)
+                else:
+                    continue
+
+                if len(node_lines) + len(link_lines) >= chunksize:
+                    yield (
+                        Project._log_lines_to_df(node_lines, node_schema),
+                        Project._log_lines_to_df(link_lines, link_schema),
+                    )
+                    node_lines = []
+                    link_lines = []
+
+            yield (
+                Project._log_lines_to_df(node_lines, node_schema),
+                Project._log_lines_to_df(link_lines, link_schema),
+            )
+
+    @staticmethod
+    def _log_schema(header_line: str, parameters: Parameters) -> dict:
+        """
+        Creates the column names and types for node or link records from
+        the Node or Link header line of a Cube log file.
+
+        Args:
+            header_line (str): Node or Link header line, e.g. "Link,A,B,NAME[111],..."
+            parameters (Parameters): Lasso parameters with the variable crosswalks and
+                int_col and float_col variable types.
+
+        Returns:
+            A dictionary with the column "names" in order and their "dtype".
+        """
+        to_net_dict = Project._read_to_net_crosswalk(parameters)
+
+        # time period and category splits have the same type as their source variable
+        split_to_var_dict = {
+            out_var: params["v"]
+            for out_var, params in parameters.properties_to_split.items()
+        }
+
+        names = ["OBJECT", "OPERATION", "GROUP"]
+        dtype = {"OBJECT": str, "OPERATION": str, "GROUP": np.int64}
+
+        for name in header_line.strip().split(",")[1:]:
+            names.append(name)
+            # columns with a declared width keep it in their name, e.g. NAME[111]
+            if "[" in name:
+                dtype[name] = str
+                continue
+
+            net_name = to_net_dict.get(name, name)
+            for out_var, v in split_to_var_dict.items():
+                if net_name.startswith(out_var + "_"):
+                    net_name = v
+                    break
+
+            if net_name in parameters.int_col:
+                dtype[name] = np.int64
+            elif net_name in parameters.float_col:
+                dtype[name] = np.float64
+            else:
+                dtype[name] = str
+
+        return {"names": names, "dtype": dtype}
+
+    @staticmethod
+    def _log_lines_to_df(lines: list, schema: dict) -> DataFrame:
+        """
+        Parses node or link records from a Cube log file into a typed DataFrame.
+
+        Records can mix "," and ";" as delimiters and can have quoted strings.
+        Unquoted ";" are changed to "," so that the records can be parsed with
+        the C engine of pandas.read_csv.
+
+        Args:
+            lines (list): Node or link records from the log file.
+            schema (dict): Column names and types from :py:meth:`_log_schema`.
+
+        Returns:
+            A DataFrame with a row for each record.
+        """
+        if not lines:
+            if schema is None:
+                return DataFrame()
+            return DataFrame(
+                {c: pd.Series(dtype=t) for c, t in schema["dtype"].items()},
+                columns=schema["names"],
+            )
+
+        text = "".join(lines)
+        if '"' in text:
+            parts = text.split('"')
+            parts[::2] = [p.replace(";", ",") for p in parts[::2]]
+            text = '"'.join(parts)
+        else:
+            text = text.replace(";", ",")
+
+        dtype = schema["dtype"]
+        numeric_col = [c for c, t in dtype.items() if t is not str]
+
+        try:
+            return pd.read_csv(
+                io.StringIO(text),
+                header=None,
+                names=schema["names"],
+                dtype=dtype,
+                index_col=False,
+                keep_default_na=False,
+                na_values={c: [""] for c in numeric_col},
+                engine="c",
+            )
+        except (ValueError, OverflowError):
+            pass
+
+        # some integer column has missing or non-integer values, so read the
+        # integer columns as strings and only fall back to floats for the
+        # columns that can't be cast to integers
+        int_col = [c for c, t in dtype.items() if t is np.int64]
+        df = pd.read_csv(
+            io.StringIO(text),
+            header=None,
+            names=schema["names"],
+            dtype={c: (str if c in int_col else t) for c, t in dtype.items()},
+            index_col=False,
+            keep_default_na=False,
+            na_values={c: [""] for c in numeric_col},
+            engine="c",
+        )
+        for c in int_col:
+            try:
+                df[c] = df[c].astype(np.int64)
+            except (ValueError, TypeError, OverflowError):
+                WranglerLogger.debug(
+                    "Couldn't read log column {} as integers, reading it as floats instead.".format(
+                        c
+                    )
+                )
+                df[c] = df[c].astype(np.float64)
+        return df
+
     def determine_roadway_network_changes_compatability(self):
         """
         Checks to see that any links or nodes that change exist in base roadway network.
@@ -304,55 +1005,72 @@ class Project(object):
             "Evaluating compatibility between roadway network changes and base network. Not evaluating deletions."
         )
 
-        # CUBE log file saves all varilable names in upper cases, need to convert them to be same as network
-        log_to_net_df = pd.read_csv(self.parameters.log_to_net_crosswalk)
-        log_to_net_dict = dict(zip(log_to_net_df["log"], log_to_net_df["net"]))
-
-        dbf_to_net_df = pd.read_csv(self.parameters.net_to_dbf_crosswalk)
-        dbf_to_net_dict = dict(zip(dbf_to_net_df["dbf"], dbf_to_net_df["net"]))
-
-        for c in self.roadway_changes.columns:
-            if c in list(log_to_net_dict.keys()):
-                self.roadway_changes.rename(columns = {c : log_to_net_dict[c]},
-                                            inplace = True)
-            if c in list(dbf_to_net_dict.keys()):
-                self.roadway_changes.rename(columns = {c : dbf_to_net_dict[c]},
-                                            inplace = True)
-            else:
-                continue
+        if self.roadway_changes is None or self.roadway_changes.empty:
+            return
 
-        link_changes_df = self.roadway_changes[
-            (self.roadway_changes.OBJECT == "L")
-            & (self.roadway_changes.OPERATION == "C")
-        ]
-        link_merge_df = pd.merge(
-            link_changes_df[["A", "B"]].astype(str),
-            self.base_roadway_network.links_df[["A", "B", "model_link_id"]].astype(str),
-            how="left",
-            on=["A", "B"],
+        # CUBE log file saves all varilable names in upper cases, need to convert them to be same as network
+        to_net_dict = Project._read_to_net_crosswalk(self.parameters)
+        self.roadway_changes.rename(
+            columns={
+                c: to_net_dict[c]
+                for c in self.roadway_changes.columns
+                if c in to_net_dict
+            },
+            inplace=True,
         )
-        missing_links = link_merge_df.loc[link_merge_df["model_link_id"].isna()]
-        if missing_links.shape[0]:
-            msg = "Network missing the following AB links:\n{}".format(missing_links)
-            WranglerLogger.error(msg)
-            raise ValueError(msg)
 
-        node_changes_df = self.roadway_changes[
-            (self.roadway_changes.OBJECT == "N")
-            & (self.roadway_changes.OPERATION == "C")
-        ]
-        node_merge_df = pd.merge(
-            node_changes_df[["model_node_id"]],
-            self.base_roadway_network.nodes_df[["model_node_id", "geometry"]],
-            how="left",
-            on=["model_node_id"],
-        )
-        missing_nodes = node_merge_df.loc[node_merge_df["geometry"].isna()]
-        if missing_nodes.shape[0]:
-            msg = "Network missing the following nodes:\n{}".format(missing_nodes)
+        changes_df = self.roadway_changes[self.roadway_changes.OPERATION == "C"]
+        msg_list = []
+
+        link_changes_df = changes_df[changes_df.OBJECT == "L"]
+        if len(link_changes_df):
+            link_positions = self.base_roadway_network.get_link_positions_by_AB(
+                link_changes_df["A"], link_changes_df["B"]
+            )
+            missing_links = link_changes_df.loc[link_positions == -1, ["A", "B"]]
+            if missing_links.shape[0]:
+                msg_list.append(
+                    "Network missing the following AB links:\n{}".format(missing_links)
+                )
+
+        node_changes_df = changes_df[changes_df.OBJECT == "N"]
+        if len(node_changes_df):
+            node_positions = self.base_roadway_network.get_node_positions_by_model_node_id(
+                node_changes_df["model_node_id"]
+            )
+            missing_nodes = node_changes_df.loc[node_positions == -1, ["model_node_id"]]
+            if missing_nodes.shape[0]:
+                msg_list.append(
+                    "Network missing the following nodes:\n{}".format(missing_nodes)
+                )
+
+        if msg_list:
+            msg = "\n".join(msg_list)
             WranglerLogger.error(msg)
             raise ValueError(msg)
 
+    @staticmethod
+    def _read_to_net_crosswalk(parameters: Parameters) -> dict:
+        """
+        Reads the crosswalks from Cube log and dbf variable names to network
+        variable names.
+
+        Args:
+            parameters (Parameters): Lasso parameters with the log_to_net_crosswalk
+                and net_to_dbf_crosswalk files.
+
+        Returns:
+            A dictionary from log or dbf variable name to network variable name.
+            Log variable names take precedence over dbf variable names.
+        """
+        log_to_net_df = pd.read_csv(parameters.log_to_net_crosswalk)
+        dbf_to_net_df = pd.read_csv(parameters.net_to_dbf_crosswalk)
+
+        to_net_dict = dict(zip(dbf_to_net_df["dbf"], dbf_to_net_df["net"]))
+        to_net_dict.update(dict(zip(log_to_net_df["log"], log_to_net_df["net"])))
+
+        return to_net_dict
+
     def evaluate_changes(self):
         """
         Determines which changes should be evaluated, initiates
@@ -364,7 +1082,7 @@ class Project(object):
         WranglerLogger.info("Evaluating project changes.")
 
         if not self.roadway_changes.empty:
-            highway_change_list = self.add_highway_changes()
+            highway_change_list = self._highway_change_frames()
 
         if (self.transit_changes is not None) or (
             self.base_transit_network is not None
@@ -372,10 +1090,10 @@ class Project(object):
         ):
             transit_change_list = self.add_transit_changes()
 
-        self.card_data = {
-            "project": self.project_name,
-            "changes": transit_change_list + highway_change_list,
-        }
+        # card_data is made from the changes when it is first used, so that
+        # streamed project cards can be written without it
+        self._card_data = None
+        self._card_changes = transit_change_list + highway_change_list
 
     def add_transit_changes(self):
         """
@@ -397,6 +1115,27 @@ class Project(object):
         Args:
             limit_variables_to_existing_network (bool): True if no ad-hoc variables.  Default to False.
         """
+        return [
+            Project._change_records(change)
+            for change in self._highway_change_frames(
+                limit_variables_to_existing_network
+            )
+        ]
+
+    def _highway_change_frames(self, limit_variables_to_existing_network=False):
+        """
+        Evaluates changes from the log file based on the base highway object,
+        like :py:meth:`add_highway_changes`, but keeps the links and nodes of
+        "New Roadway" changes as DataFrames and the links of "Roadway Deletion"
+        changes as a Series, so that they can be written to a project card
+        one record at a time.
+
+        Args:
+            limit_variables_to_existing_network (bool): True if no ad-hoc variables.  Default to False.
+
+        Returns:
+            A list of change dictionaries.
+        """
 
         ## if worth it, could also add some functionality  to network wrangler itself.
         node_changes_df = self.roadway_changes[
@@ -407,50 +1146,13 @@ class Project(object):
             self.roadway_changes.OBJECT == "L"
         ].copy()
 
-        def _final_op(x):
-            if x.OPERATION_history[-1] == "D":
-                if "A" in x.OPERATION_history[:-1]:
-                    return "N"
-                else:
-                    return "D"
-            elif x.OPERATION_history[-1] == "A":
-                if "D" in x.OPERATION_history[:-1]:
-                    return "C"
-                else:
-                    return "A"
-            else:
-                if "A" in x.OPERATION_history[:-1]:
-                    return "A"
-                else:
-                    return "C"
-
-        def _consolidate_actions(log, base, key_list):
-            log_df = log.copy()
-            # will be changed if to allow new variables being added/changed that are not in base network
-            changeable_col = [x for x in log_df.columns if x in base.columns]
-
-            for x in changeable_col:
-                log_df[x] = log_df[x].astype(base[x].dtype)
-
-            action_history_df = (
-                log_df.groupby(key_list)["OPERATION"]
-                .agg(lambda x: x.tolist())
-                .rename("OPERATION_history")
-                .reset_index()
-            )
-
-            log_df = pd.merge(log_df, action_history_df, on=key_list, how="left")
-            log_df.drop_duplicates(subset=key_list, keep="last", inplace=True)
-            log_df["OPERATION_final"] = log_df.apply(lambda x: _final_op(x), axis=1)
-            return log_df[changeable_col + ["OPERATION_final"]]
-
         if len(link_changes_df) != 0:
-            link_changes_df = _consolidate_actions(
+            link_changes_df = Project._consolidate_actions(
                 link_changes_df, self.base_roadway_network.links_df, ["A", "B"]
             )
 
         if len(node_changes_df) != 0:
-            node_changes_df = _consolidate_actions(
+            node_changes_df = Project._consolidate_actions(
                 node_changes_df, self.base_roadway_network.nodes_df, ["model_node_id"]
             )
 
@@ -471,7 +1173,7 @@ class Project(object):
 
         cube_delete_df = link_changes_df[link_changes_df.OPERATION_final == "D"]
         if cube_delete_df.shape[1] > 0:
-            links_to_delete = cube_delete_df["model_link_id"].tolist()
+            links_to_delete = cube_delete_df["model_link_id"]
             delete_link_dict = {
                 "category": "Roadway Deletion",
                 "links": {"model_link_id": links_to_delete},
@@ -495,22 +1197,20 @@ class Project(object):
                 add_col = cube_add_df.columns
                 # can leave out "OPERATION_final" from writing out, is there a reason to write it out?
 
-            add_link_properties = cube_add_df[add_col].to_dict("records")
+            add_links_df = cube_add_df[add_col]
 
-            # WranglerLogger.debug("Add Link Properties: {}".format(add_link_properties))
-            WranglerLogger.debug("{} Links Added".format(len(add_link_properties)))
+            # WranglerLogger.debug("Add Link Properties: {}".format(add_links_df))
+            WranglerLogger.debug("{} Links Added".format(len(add_links_df)))
 
-            add_link_dict = {"category": "New Roadway", "links": add_link_properties}
+            add_link_dict = {"category": "New Roadway", "links": add_links_df}
         else:
             WranglerLogger.debug("No link additions processed")
             add_link_dict = {}
 
         if len(node_add_df):
-            add_nodes_dict_list = node_add_df.drop(["OPERATION_final"], axis=1).to_dict(
-                "records"
-            )
-            WranglerLogger.debug("{} Nodes Added".format(len(add_nodes_dict_list)))
-            add_link_dict["nodes"] = add_nodes_dict_list
+            add_nodes_df = node_add_df.drop(["OPERATION_final"], axis=1)
+            WranglerLogger.debug("{} Nodes Added".format(len(add_nodes_df)))
+            add_link_dict["nodes"] = add_nodes_df
         else:
             WranglerLogger.debug("No Nodes Added")
             node_dict_list = None
@@ -524,145 +1224,32 @@ class Project(object):
             if x in self.base_roadway_network.links_df.columns
         ]
 
-        change_link_dict_df = pd.DataFrame()
-
-        if len(link_changes_df[
-            link_changes_df.OPERATION_final == "C"
-            ]) > 0:
-
-            for index, change_row in link_changes_df[
-                link_changes_df.OPERATION_final == "C"
-            ].iterrows():
-
-                base_df = self.base_roadway_network.links_df[
-                    (self.base_roadway_network.links_df["A"] == change_row.A)
-                    & (self.base_roadway_network.links_df["B"] == change_row.B)
-                ]
-
-                if not base_df.shape[0]:
-                    msg = "No match found in network for AB combination: ({},{}). Incompatible base network.".format(
-                        change_row.A, change_row.B
-                    )
-                    WranglerLogger.error(msg)
-                    raise ValueError(msg)
-
-                if base_df.shape[0] > 1:
-                    WranglerLogger.warning(
-                            "Found more than one match in base network for AB combination: ({},{}). Selecting first one to operate on but AB should be unique to network.".format(
-                            row.A, row.B
-                        )
-                    )
-                base_row = base_df.iloc[0]
-
-                out_col = []
-                for col in changeable_col:
-                # if it is the same as before, or a static value, don't process as a change
-                    if (str(change_row[col]) == base_row[col].astype(str)) | (
-                        col in Project.STATIC_VALUES
-                    ):
-                        continue
-                    if ((col == "roadway_class") & (change_row[col] == 0)):
-                        continue
-                    # only look at distance if it has significantly changed
-                    if col == "distance":
-                        if (
-                            abs(
-                                (change_row[col] - base_row[col].astype(float))
-                                / base_row[col].astype(float)
-                            )
-                                > 0.01
-                        ):
-                            out_col.append(col)
-                        else:
-                            continue
-                    else:
-                        out_col.append(col)
-
-                if len(out_col) > 0:
-                    property_dict_list = []
-                    for c in out_col:
-                        if (c[:-3] in list(self.parameters.properties_to_split.keys())) | (
-                                c.split("_")[0] == "price"
-                            ) :
-                            split_existing = 0
-                            for property in property_dict_list:
-                                if (property["property"] == c.split("_")[0]) & (property["existing"] == base_row[c]):
-                                    if (c.split("_")[0] == "price") :
-                                        property["timeofday"] = property["timeofday"] + [{
-                                            "time" : list(self.parameters.time_period_to_time[c.split("_")[-1]]),
-                                            "category" : c.split("_")[-2],
-                                            "set" : change_row[c]
-                                        }]
-                                    else:
-                                        property["timeofday"] = property["timeofday"] + [{
-                                            "time" : list(self.parameters.time_period_to_time[c.split("_")[-1]]),
-                                            "set" : change_row[c]
-                                        }]
-                                    split_existing = 1
-                                else:
-                                    continue
-                            if split_existing == 0:
-                                property_dict = {}
-                                if c.split("_")[0] == "ML":
-                                    property_dict["property"] = c[:-3]
-                                else:
-                                    property_dict["property"] = c.split("_")[0]
-                                property_dict["existing"] = base_row[c]
-                                if (c.split("_")[0] == "price") :
-                                    property_dict["timeofday"] = [{
-                                        "time" : list(self.parameters.time_period_to_time[c.split("_")[-1]]),
-                                        "category" : c.split("_")[-2],
-                                        "set" : change_row[c]
-                                    }]
-                                else:
-                                    property_dict["timeofday"] = [{
-                                        "time" : list(self.parameters.time_period_to_time[c.split("_")[-1]]),
-                                        "set" : change_row[c]
-                                    }]
-                                property_dict_list.append(property_dict)
-                        else:
-                            property_dict = {}
-                            property_dict["property"] = c
-                            property_dict["existing"] = base_row[c]
-                            property_dict["set"] = change_row[c]
-                            property_dict_list.append(property_dict)
-                        # WranglerLogger.debug("property_dict_list: {}".format(property_dict_list))
-                        # WranglerLogger.debug("base_df.model_link_id: {}".format(base_row['model_link_id']))
-                    card_df = pd.DataFrame(
-                            {
-                            "properties": pd.Series([property_dict_list]),
-                            "model_link_id": pd.Series(base_row["model_link_id"]),
-                            }
-                        )
-                else:
-                    card_df = pd.DataFrame()
-                # WranglerLogger.debug('card_df: {}'.format(card_df))
-                change_link_dict_df = pd.concat(
-                            [change_link_dict_df, card_df], ignore_index=True, sort=False
-                        )
+        cube_change_df = link_changes_df[link_changes_df.OPERATION_final == "C"]
 
-            change_link_dict_df["properties"] = change_link_dict_df["properties"].astype(
-                    str
-                )
-            # WranglerLogger.debug('change_link_dict_df 1: {}'.format(change_link_dict_df))
-            change_link_dict_df = (
-                change_link_dict_df.groupby("properties")[["model_link_id"]]
-                .agg(lambda x: list(x))
-                .reset_index()
-            )
-            # WranglerLogger.debug('change_link_dict_df 2: {}'.format(change_link_dict_df))
-            change_link_dict_df["facility"] = change_link_dict_df.apply(
-                lambda x: {"link": {"model_link_id": x.model_link_id}}, axis=1
+        if len(cube_change_df) > 0:
+            change_link_dict_df = self._evaluate_link_attribute_changes(
+                cube_change_df, changeable_col
             )
 
-            # WranglerLogger.debug('change_link_dict_df 3: {}'.format(change_link_dict_df))
-            change_link_dict_df["properties"] = change_link_dict_df["properties"].apply(
-                lambda x: json.loads(x.replace("'", '"'))
-            )
+        if len(cube_change_df) > 0 and len(change_link_dict_df) > 0:
 
-            change_link_dict_list = change_link_dict_df[["facility", "properties"]].to_dict(
-                "record"
-            )
+            # group links with the same property changes on a hashable signature
+            link_id_groups = {}
+            for properties, model_link_id in zip(
+                change_link_dict_df["properties"], change_link_dict_df["model_link_id"]
+            ):
+                link_id_groups.setdefault(
+                    Project._change_signature(properties), []
+                ).append(Project._change_signature(model_link_id))
+
+            change_link_dict_list = [
+                {
+                    "facility": {"link": {"model_link_id": model_link_ids}},
+                    "properties": Project._change_from_signature(signature),
+                }
+                for signature, model_link_ids in link_id_groups.items()
+            ]
+            change_link_dict_list.sort(key=lambda x: str(x["properties"]))
 
             for change in change_link_dict_list:
                 change["category"] = "Roadway Attribute Change"
@@ -678,3 +1265,300 @@ class Project(object):
         )
 
         return highway_change_list
+
+    @staticmethod
+    def _consolidate_actions(log, base, key_list):
+        """
+        Consolidates the operations of each node or link in a Cube log into
+        one final operation.
+
+        The final operation depends on the last operation and on whether the
+        node or link was added or deleted before it:
+
+        - deleted after an earlier add: "N", nothing to do
+        - deleted: "D"
+        - added after an earlier delete: "C"
+        - added: "A"
+        - changed after an earlier add: "A"
+        - changed: "C"
+
+        Args:
+            log (DataFrame): node or link records of the log with an OPERATION.
+            base (DataFrame): base network nodes or links.
+            key_list (list): columns that identify a node or link.
+
+        Returns:
+            DataFrame with the last record of each node or link, the columns
+            that are also in the base network and OPERATION_final.
+        """
+        log_df = log.copy().reset_index(drop=True)
+        # will be changed if to allow new variables being added/changed that are not in base network
+        changeable_col = [x for x in log_df.columns if x in base.columns]
+
+        for x in changeable_col:
+            if log_df[x].dtype != base[x].dtype:
+                log_df[x] = log_df[x].astype(base[x].dtype)
+
+        # count adds and deletes for each key, then take the last operation
+        # and whether there was an earlier add or delete before it
+        log_df["_add"] = (log_df["OPERATION"] == "A").astype(int)
+        log_df["_delete"] = (log_df["OPERATION"] == "D").astype(int)
+        op_count_df = log_df.groupby(key_list)[["_add", "_delete"]].transform("sum")
+
+        log_df["_earlier_add"] = (op_count_df["_add"] - log_df["_add"]) > 0
+        log_df["_earlier_delete"] = (op_count_df["_delete"] - log_df["_delete"]) > 0
+        log_df.drop_duplicates(subset=key_list, keep="last", inplace=True)
+
+        log_df["OPERATION_final"] = np.select(
+            [log_df["OPERATION"] == "D", log_df["OPERATION"] == "A"],
+            [
+                np.where(log_df["_earlier_add"], "N", "D"),
+                np.where(log_df["_earlier_delete"], "C", "A"),
+            ],
+            default=np.where(log_df["_earlier_add"], "A", "C"),
+        )
+        return log_df[changeable_col + ["OPERATION_final"]]
+
+    @staticmethod
+    def _change_records(value):
+        """
+        Turns the DataFrames of a change from :py:meth:`_highway_change_frames`
+        into lists of records and its Series into lists, as in card_data.
+
+        Args:
+            value: A change dictionary or one of its values.
+
+        Returns:
+            The value with lists in place of DataFrames and Series.
+        """
+        if isinstance(value, DataFrame):
+            return value.to_dict("records")
+        if isinstance(value, pd.Series):
+            return value.tolist()
+        if isinstance(value, dict):
+            return {k: Project._change_records(v) for k, v in value.items()}
+        return value
+
+    @staticmethod
+    def _change_signature(value):
+        """
+        Creates a hashable signature of a project card change value so that
+        identical changes can be grouped.
+
+        Dictionaries and lists are made into tagged tuples, numpy scalars into
+        python scalars and NaN into None.
+
+        Args:
+            value: A change value, e.g. a list of property change dictionaries.
+
+        Returns:
+            A hashable signature that :py:meth:`_change_from_signature` turns back
+            into the change value.
+        """
+        if isinstance(value, dict):
+            return (
+                dict,
+                tuple((k, Project._change_signature(v)) for k, v in value.items()),
+            )
+        if isinstance(value, (list, tuple)):
+            return (list, tuple(Project._change_signature(v) for v in value))
+        if isinstance(value, np.generic):
+            value = value.item()
+        if isinstance(value, float) and np.isnan(value):
+            return None
+        return value
+
+    @staticmethod
+    def _change_from_signature(signature):
+        """
+        Creates a project card change value from its signature.
+
+        Args:
+            signature: A signature from :py:meth:`_change_signature`.
+
+        Returns:
+            The change value, made of dictionaries, lists and python scalars.
+        """
+        if isinstance(signature, tuple) and signature:
+            if signature[0] is dict:
+                return {
+                    k: Project._change_from_signature(v) for k, v in signature[1]
+                }
+            if signature[0] is list:
+                return [Project._change_from_signature(v) for v in signature[1]]
+        return signature
+
+    def _evaluate_link_attribute_changes(self, link_changes_df, changeable_col):
+        """
+        Compares changed links to the base network in bulk and creates the
+        property change lists for each link that has changed.
+
+        Changed links are looked up in the base network by (A, B) all at once
+        and the changed columns are flagged for every link and column at the same time.
+
+        Args:
+            link_changes_df (DataFrame): consolidated link changes with an OPERATION_final of "C".
+            changeable_col (list): columns in both the link changes and the base network.
+
+        Returns:
+            DataFrame with a "properties" list and the "model_link_id" for each changed link.
+        """
+        base_links_df = self.base_roadway_network.links_df
+
+        compare_col = [
+            c for c in changeable_col if c not in ["A", "B"] + Project.STATIC_VALUES
+        ]
+        base_col = list(dict.fromkeys(["model_link_id"] + compare_col))
+
+        base_positions = self.base_roadway_network.get_link_positions_by_AB(
+            link_changes_df["A"], link_changes_df["B"]
+        )
+
+        if (base_positions == -1).any():
+            missing = np.flatnonzero(base_positions == -1)[0]
+            msg = "No match found in network for AB combination: ({},{}). Incompatible base network.".format(
+                link_changes_df["A"].iloc[missing], link_changes_df["B"].iloc[missing]
+            )
+            WranglerLogger.error(msg)
+            raise ValueError(msg)
+
+        for i in np.flatnonzero(
+            self.base_roadway_network.is_duplicated_AB(base_positions)
+        ):
+            WranglerLogger.warning(
+                "Found more than one match in base network for AB combination: ({},{}). Selecting first one to operate on but AB should be unique to network.".format(
+                    link_changes_df["A"].iloc[i], link_changes_df["B"].iloc[i]
+                )
+            )
+
+        join_df = link_changes_df[compare_col].reset_index(drop=True)
+        for c in base_col:
+            join_df[c + "_base"] = base_links_df[c].values[base_positions]
+
+        # if it is the same as before, or a static value, don't process as a change
+        change_mask_df = DataFrame(index=join_df.index)
+        for col in compare_col:
+            # compare the str() of each value, so that missing values match
+            changed = pd.Series(
+                join_df[col].values.astype(str)
+                != join_df[col + "_base"].values.astype(str),
+                index=join_df.index,
+            )
+            if col == "roadway_class":
+                changed &= join_df[col] != 0
+            # only look at distance if it has significantly changed
+            if col == "distance":
+                base_distance = join_df[col + "_base"].astype(float)
+                changed &= (
+                    (join_df[col].astype(float) - base_distance) / base_distance
+                ).abs() > 0.01
+            change_mask_df[col] = changed
+
+        change_values = {c: join_df[c].values for c in compare_col}
+        base_values = {c: join_df[c + "_base"].values for c in base_col}
+        change_mask = change_mask_df.values
+
+        property_dict_lists = []
+        model_link_ids = []
+        for i in np.flatnonzero(change_mask.any(axis=1)):
+            out_col = [compare_col[j] for j in np.flatnonzero(change_mask[i])]
+            property_dict_lists.append(
+                self._link_property_dict_list(
+                    out_col,
+                    {c: change_values[c][i] for c in out_col},
+                    {c: base_values[c][i] for c in out_col},
+                )
+            )
+            model_link_ids.append(base_values["model_link_id"][i])
+
+        return DataFrame(
+            {
+                "properties": pd.Series(property_dict_lists, dtype=object),
+                "model_link_id": pd.Series(model_link_ids, dtype=object),
+            }
+        )
+
+    def _link_property_dict_list(self, out_col, change_row, base_row):
+        """
+        Creates the project card property changes for a single link.
+
+        Properties that are split by time period (and category for price) are
+        grouped under their base property name with a "timeofday" list.
+
+        Args:
+            out_col (list): columns that have changed for this link.
+            change_row (dict): changed values keyed by column.
+            base_row (dict): base network values keyed by column.
+
+        Returns:
+            list of property change dictionaries.
+        """
+        property_dict_list = []
+        for c in out_col:
+            if (c[:-3] in list(self.parameters.properties_to_split.keys())) | (
+                c.split("_")[0] == "price"
+            ):
+                split_existing = 0
+                for property in property_dict_list:
+                    if (property["property"] == c.split("_")[0]) & (
+                        property["existing"] == base_row[c]
+                    ):
+                        if c.split("_")[0] == "price":
+                            property["timeofday"] = property["timeofday"] + [
+                                {
+                                    "time": list(
+                                        self.parameters.time_period_to_time[
+                                            c.split("_")[-1]
+                                        ]
+                                    ),
+                                    "category": c.split("_")[-2],
+                                    "set": change_row[c],
+                                }
+                            ]
+                        else:
+                            property["timeofday"] = property["timeofday"] + [
+                                {
+                                    "time": list(
+                                        self.parameters.time_period_to_time[
+                                            c.split("_")[-1]
+                                        ]
+                                    ),
+                                    "set": change_row[c],
+                                }
+                            ]
+                        split_existing = 1
+                if split_existing == 0:
+                    property_dict = {}
+                    if c.split("_")[0] == "ML":
+                        property_dict["property"] = c[:-3]
+                    else:
+                        property_dict["property"] = c.split("_")[0]
+                    property_dict["existing"] = base_row[c]
+                    if c.split("_")[0] == "price":
+                        property_dict["timeofday"] = [
+                            {
+                                "time": list(
+                                    self.parameters.time_period_to_time[c.split("_")[-1]]
+                                ),
+                                "category": c.split("_")[-2],
+                                "set": change_row[c],
+                            }
+                        ]
+                    else:
+                        property_dict["timeofday"] = [
+                            {
+                                "time": list(
+                                    self.parameters.time_period_to_time[c.split("_")[-1]]
+                                ),
+                                "set": change_row[c],
+                            }
+                        ]
+                    property_dict_list.append(property_dict)
+            else:
+                property_dict = {}
+                property_dict["property"] = c
+                property_dict["existing"] = base_row[c]
+                property_dict["set"] = change_row[c]
+                property_dict_list.append(property_dict)
+
+        return property_dict_list
@@ -27,6 +27,9 @@ class ModelRoadwayNetwork(RoadwayNetwork):
         """
         Constructor
         """
+        self._link_index = None
+        self._node_index = None
+
         super().__init__(nodes, links, shapes)
 
         # will have to change if want to alter them
@@ -38,6 +41,213 @@ class ModelRoadwayNetwork(RoadwayNetwork):
         ##todo also write to file
         # WranglerLogger.debug("Used PARAMS\n", '\n'.join(['{}: {}'.format(k,v) for k,v in self.parameters.__dict__.items()]))
 
+    @property
+    def links_df(self):
+        """
+        Links of the roadway network.
+
+        Setting a new links DataFrame drops the link lookup index so that it
+        is rebuilt from the new links the next time it is needed.
+        """
+        return self._links_df
+
+    @links_df.setter
+    def links_df(self, links_df):
+        self._links_df = links_df
+        self._link_index = None
+
+    @property
+    def nodes_df(self):
+        """
+        Nodes of the roadway network.
+
+        Setting a new nodes DataFrame drops the node lookup index so that it
+        is rebuilt from the new nodes the next time it is needed.
+        """
+        return self._nodes_df
+
+    @nodes_df.setter
+    def nodes_df(self, nodes_df):
+        self._nodes_df = nodes_df
+        self._node_index = None
+
+    def invalidate_indexes(self):
+        """
+        Drops the link and node lookup indexes so that they are rebuilt the
+        next time they are needed.
+
+        The indexes are dropped when links_df or nodes_df is reassigned or
+        their rows change, but not when the A, B, model_link_id or
+        model_node_id values are edited in place, so call this after such
+        edits.
+        """
+        self._link_index = None
+        self._node_index = None
+
+    def _get_link_index(self):
+        """
+        Returns the link lookup index, building it if it doesn't exist yet or
+        if the rows of links_df have changed since it was built. Edits of the
+        key values in place need :py:meth:`invalidate_indexes`.
+
+        The index maps (A, B) and model_link_id to the row position of the
+        first matching link in links_df.
+        """
+        links_df = self.links_df
+
+        if (
+            self._link_index is not None
+            and self._link_index["rows"] is links_df.index
+        ):
+            return self._link_index
+
+        WranglerLogger.debug("Building link lookup index")
+
+        ab_index = pd.MultiIndex.from_arrays(
+            [links_df["A"].values, links_df["B"].values], names=["A", "B"]
+        )
+        first_ab = ~ab_index.duplicated(keep="first")
+
+        id_index = pd.Index(links_df["model_link_id"].values)
+        first_id = ~id_index.duplicated(keep="first")
+
+        self._link_index = {
+            "rows": links_df.index,
+            "ab": ab_index[first_ab],
+            "ab_positions": np.flatnonzero(first_ab),
+            "ab_duplicated": ab_index.duplicated(keep=False),
+            "model_link_id": id_index[first_id],
+            "model_link_id_positions": np.flatnonzero(first_id),
+        }
+
+        return self._link_index
+
+    def _get_node_index(self):
+        """
+        Returns the node lookup index, building it if it doesn't exist yet or
+        if the rows of nodes_df have changed since it was built. Edits of the
+        key values in place need :py:meth:`invalidate_indexes`.
+
+        The index maps model_node_id to the row position of the first matching
+        node in nodes_df.
+        """
+        nodes_df = self.nodes_df
+
+        if (
+            self._node_index is not None
+            and self._node_index["rows"] is nodes_df.index
+        ):
+            return self._node_index
+
+        WranglerLogger.debug("Building node lookup index")
+
+        id_index = pd.Index(nodes_df["model_node_id"].values)
+        first_id = ~id_index.duplicated(keep="first")
+
+        self._node_index = {
+            "rows": nodes_df.index,
+            "model_node_id": id_index[first_id],
+            "model_node_id_positions": np.flatnonzero(first_id),
+        }
+
+        return self._node_index
+
+    @staticmethod
+    def _coerce_link_keys(keys, dtype):
+        """
+        Casts lookup keys to the dtype of the index they are looked up in, so
+        that e.g. node numbers read from a Cube log as strings match the
+        integer node numbers in the network. Keys that can't be cast won't match.
+        """
+        keys = pd.Series(np.asarray(keys))
+        if keys.dtype == dtype:
+            return keys.values
+        if pd.api.types.is_numeric_dtype(dtype):
+            keys = pd.to_numeric(keys, errors="coerce")
+            if pd.api.types.is_integer_dtype(dtype) and not keys.isna().any():
+                keys = keys.astype(dtype)
+            return keys.values
+        return keys.astype(dtype).values
+
+    def get_link_positions_by_AB(self, A, B):
+        """
+        Finds the row positions in links_df of links by their A and B nodes.
+
+        Args:
+            A (array-like): A node of each link to look up.
+            B (array-like): B node of each link to look up, same length as A.
+
+        Returns:
+            numpy array with the row position of each link in links_df, -1 where
+            the link isn't in the network. If an (A, B) pair is in links_df more
+            than once, the position of the first one is returned.
+        """
+        link_index = self._get_link_index()
+        ab_index = link_index["ab"]
+
+        keys = pd.MultiIndex.from_arrays(
+            [
+                ModelRoadwayNetwork._coerce_link_keys(A, self.links_df["A"].dtype),
+                ModelRoadwayNetwork._coerce_link_keys(B, self.links_df["B"].dtype),
+            ]
+        )
+        found = ab_index.get_indexer(keys)
+
+        return np.where(found >= 0, link_index["ab_positions"][found], -1)
+
+    def get_link_positions_by_model_link_id(self, model_link_ids):
+        """
+        Finds the row positions in links_df of links by their model_link_id.
+
+        Args:
+            model_link_ids (array-like): model_link_id of each link to look up.
+
+        Returns:
+            numpy array with the row position of each link in links_df, -1 where
+            the link isn't in the network.
+        """
+        link_index = self._get_link_index()
+
+        keys = ModelRoadwayNetwork._coerce_link_keys(
+            model_link_ids, self.links_df["model_link_id"].dtype
+        )
+        found = link_index["model_link_id"].get_indexer(keys)
+
+        return np.where(found >= 0, link_index["model_link_id_positions"][found], -1)
+
+    def get_node_positions_by_model_node_id(self, model_node_ids):
+        """
+        Finds the row positions in nodes_df of nodes by their model_node_id.
+
+        Args:
+            model_node_ids (array-like): model_node_id of each node to look up.
+
+        Returns:
+            numpy array with the row position of each node in nodes_df, -1 where
+            the node isn't in the network.
+        """
+        node_index = self._get_node_index()
+
+        keys = ModelRoadwayNetwork._coerce_link_keys(
+            model_node_ids, self.nodes_df["model_node_id"].dtype
+        )
+        found = node_index["model_node_id"].get_indexer(keys)
+
+        return np.where(found >= 0, node_index["model_node_id_positions"][found], -1)
+
+    def is_duplicated_AB(self, positions):
+        """
+        Checks if the links at the given row positions share their (A, B)
+        combination with another link in links_df.
+
+        Args:
+            positions (array-like): row positions in links_df.
+
+        Returns:
+            numpy boolean array.
+        """
+        return self._get_link_index()["ab_duplicated"][np.asarray(positions)]
+
     @staticmethod
     def read(
         link_file: str,
@@ -1402,6 +1612,8 @@ class ModelRoadwayNetwork(RoadwayNetwork):
             if c in int_col_names:
                 self.nodes_df[c] = self.nodes_df[c].astype(int)
 
+        self.invalidate_indexes()
+
     def fill_na(self):
         """
         Fill na values from create_managed_lane_network()
@@ -1428,6 +1640,8 @@ class ModelRoadwayNetwork(RoadwayNetwork):
             else:
                 self.nodes_df[x].fillna("", inplace = True)
 
+        self.invalidate_indexes()
+
     def roadway_standard_to_met_council_network(self, output_epsg=None):
         """
         Rename and format roadway attributes to be consistent with what metcouncil's model is expecting.
@@ -9,14 +9,23 @@
     cube_transit_net.write_as_cube_lin(os.path.join(WRITE_DIR, "outfile.lin"))
 """
 import os
-import copy
 import csv
+import difflib
+import functools
+import gzip
+import hashlib
+import multiprocessing
+import re
 import datetime, time
-from typing import Any, Dict, Optional
+from collections import deque
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Union
 
 from lark import Lark, Transformer, v_args
 from pandas import DataFrame
 
+import numpy as np
 import pandas as pd
 import partridge as ptg
 
@@ -24,6 +33,12 @@ from network_wrangler import TransitNetwork
 
 from .logger import WranglerLogger
 from .parameters import Parameters
+from .util import (
+    cache_key_hash,
+    read_cache_pickle,
+    update_hash_with_file,
+    write_cache_pickle,
+)
 
 
 class CubeTransit(object):
@@ -46,11 +61,12 @@ class CubeTransit(object):
         lines (list): list of strings representing unique line names in
             the cube network.
         line_properties (dict): dictionary of line properties keyed by line name. Property
-            values are stored in a dictionary by property name. These
+            values are stored in a dictionary, or a CubeLineProperties for lines
+            that were copied to other time periods, by property name. These
             properties are directly read from the cube line files and haven't
             been translated to standard transit values.
-        shapes (dict): dictionary of shapes
-            keyed by line name. Shapes stored as a pandas DataFrame of nodes with following columns:
+        shapes (CubeShapes): mapping of shapes
+            keyed by line name. Shapes returned as a pandas DataFrame of nodes with following columns:
               - 'node_id' (int): positive integer of node id
               - 'node' (int): node number, with negative indicating a non-stop
               - 'stop' (boolean): indicates if it is a stop
@@ -62,8 +78,13 @@ class CubeTransit(object):
         source_list (list):
             List of cube line file sources that have been read and added.
         diff_dict (dict):
+        TRANSIT_LINE_FILE_CACHE_VERSION: a class-level constant that is part of
+            the cache key of parsed cube line files. Increment it when the
+            parsed data changes so that old cache entries aren't used.
     """
 
+    TRANSIT_LINE_FILE_CACHE_VERSION = 1
+
     def __init__(self, parameters={}):
         """
         line_properties_dict (dict[line names]: line level attributes)
@@ -77,7 +98,7 @@ class CubeTransit(object):
         self.lines = []
 
         self.line_properties = {}
-        self.shapes = {}
+        self.shapes = CubeShapes()
 
         self.program_type = None
 
@@ -87,12 +108,26 @@ class CubeTransit(object):
 
         self.diff_dict = Dict[str, Any]
 
-    def add_cube(self, transit_source: str) -> None:
+    def add_cube(
+        self,
+        transit_source: str,
+        parser_cache: Optional[str] = None,
+        n_workers: int = 1,
+        cache_dir: Optional[str] = None,
+    ) -> None:
         """Reads a .lin file and adds it to existing TransitNetwork instance.
 
         Parameters
         -----------
         transit_source:  a string or the directory of the cube line file to be parsed
+        parser_cache: file path of a serialized transit line file parser, see
+            :py:meth:`get_parser`
+        n_workers: number of processes to parse the line files of a directory
+            with. Lines are added in the order of the sorted file names
+            whatever the number of processes.
+        cache_dir: folder for the parsed lines of cube line files. Files are
+            looked up by a hash of their contents, so only new or changed files
+            are parsed. Defaults to the transit_cache_dir parameter.
 
         """
 
@@ -100,42 +135,59 @@ class CubeTransit(object):
         Figure out what kind of transit source it is
         """
 
-        parser = Lark(TRANSIT_LINE_FILE_GRAMMAR, debug="debug", parser="lalr")
+        if cache_dir is None:
+            cache_dir = self.parameters.transit_cache_dir
 
         if "NAME=" in transit_source:
             WranglerLogger.debug("reading transit source as string")
             self.source_list.append("input_str")
-            parse_tree = parser.parse(transit_source)
+            parsed_lines = _parse_transit_lines(transit_source, parser_cache)
+            self._add_parsed_lines(transit_source, *parsed_lines)
         elif os.path.isfile(transit_source):
             print("reading: {}".format(transit_source))
-            with open(transit_source) as file:
-                WranglerLogger.debug(
-                    "reading transit source: {}".format(transit_source)
-                )
-                self.source_list.append(transit_source)
-                parse_tree = parser.parse(file.read())
+            WranglerLogger.debug("reading transit source: {}".format(transit_source))
+            self.source_list.append(transit_source)
+            parsed_lines = _read_transit_line_files(
+                [transit_source], parser_cache, cache_dir=cache_dir
+            )[0]
+            self._add_parsed_lines(transit_source, *parsed_lines)
         elif os.path.isdir(transit_source):
             import glob
 
-            for lin_file in glob.glob(os.path.join(transit_source, "*.LIN")):
-                self.add_cube(lin_file)
-            return
+            lin_files = sorted(glob.glob(os.path.join(transit_source, "*.LIN")))
+            parsed_lines_list = _read_transit_line_files(
+                lin_files, parser_cache, n_workers=n_workers, cache_dir=cache_dir
+            )
+
+            for lin_file, parsed_lines in zip(lin_files, parsed_lines_list):
+                print("reading: {}".format(lin_file))
+                WranglerLogger.debug("reading transit source: {}".format(lin_file))
+                self.source_list.append(lin_file)
+                self._add_parsed_lines(lin_file, *parsed_lines)
         else:
-            msg: "{} not a valid transit line string, directory, or file"
+            msg = "{} not a valid transit line string, directory, or file".format(
+                transit_source
+            )
             WranglerLogger.error(msg)
             raise ValueError(msg)
 
-        WranglerLogger.debug("finished parsing cube line file")
-        # WranglerLogger.debug("--Parse Tree--\n {}".format(parse_tree.pretty()))
-        transformed_tree_data = CubeTransformer().transform(parse_tree)
-        # WranglerLogger.debug("--Transformed Tree Data --\n {}".format(transformed_tree_data["lines"]))
+    def _add_parsed_lines(
+        self,
+        transit_source: str,
+        program_type: str,
+        line_properties_dict: dict,
+        line_shapes_dict: dict,
+    ) -> None:
+        """
+        Adds parsed lines to this instance, after checking that none of them
+        are already in it.
 
-        line_properties_dict = {
-            k: v["line_properties"] for k, v in transformed_tree_data["lines"].items()
-        }
-        line_shapes_dict = {
-            k: v["line_shape"] for k, v in transformed_tree_data["lines"].items()
-        }
+        Args:
+            transit_source: the cube line file string or file the lines are from
+            program_type: Either PT or TRNBLD
+            line_properties_dict: line properties keyed by line name
+            line_shapes_dict: line shapes keyed by line name
+        """
         new_lines = list(line_properties_dict.keys())
         """
         Before adding lines, check to see if any are overlapping with existing ones in the network
@@ -154,7 +206,7 @@ class CubeTransit(object):
             WranglerLogger.error(msg)
             raise ValueError(msg)
 
-        self.program_type = transformed_tree_data["program_type"]
+        self.program_type = program_type
         self.lines += new_lines
         self.line_properties.update(line_properties_dict)
         self.shapes.update(line_shapes_dict)
@@ -162,23 +214,71 @@ class CubeTransit(object):
         WranglerLogger.debug("Added lines to CubeTransit: \n".format(new_lines))
 
     @staticmethod
-    def create_from_cube(transit_source: str):
+    def get_parser(cache: Optional[str] = None, transform: bool = False) -> Lark:
+        """
+        Returns the LALR parser for cube line files.
+
+        The parser is built from TRANSIT_LINE_FILE_GRAMMAR once per process
+        and reused for every line file that is read afterwards.
+
+        Args:
+            cache: file path of a serialized parser. If the file exists and
+                was made from the current grammar, the parser is loaded from it
+                without analyzing the grammar. Otherwise the parser is built and
+                saved to it.
+            transform: if True, the parser applies a CubeTransformer while it
+                parses and returns the transformed data rather than a parse
+                tree, so the full parse tree is never built.
+
+        Returns:
+            A Lark parser.
+        """
+        if (cache, transform) not in _TRANSIT_LINE_FILE_PARSERS:
+            WranglerLogger.debug("Building cube line file parser")
+            _TRANSIT_LINE_FILE_PARSERS[(cache, transform)] = Lark(
+                TRANSIT_LINE_FILE_GRAMMAR,
+                debug="debug",
+                parser="lalr",
+                transformer=CubeTransformer() if transform else None,
+                cache=cache if cache else False,
+            )
+        return _TRANSIT_LINE_FILE_PARSERS[(cache, transform)]
+
+    @staticmethod
+    def create_from_cube(
+        transit_source: str,
+        parser_cache: Optional[str] = None,
+        n_workers: int = 1,
+        cache_dir: Optional[str] = None,
+        parameters={},
+    ):
         """
         Reads a cube .lin file and stores as TransitNetwork object.
 
         Args:
             transit_source:  a string or the directory of the cube line file to be parsed
+            parser_cache: file path of a serialized transit line file parser, see
+                :py:meth:`get_parser`
+            n_workers: number of processes to parse the line files of a directory with
+            cache_dir: folder for the parsed lines of cube line files, see
+                :py:meth:`add_cube`
+            parameters: Lasso parameters
 
         Returns:
             A ::CubeTransit object created from the transit_source.
         """
 
-        tn = CubeTransit()
-        tn.add_cube(transit_source)
+        tn = CubeTransit(parameters=parameters)
+        tn.add_cube(
+            transit_source,
+            parser_cache=parser_cache,
+            n_workers=n_workers,
+            cache_dir=cache_dir,
+        )
 
         return tn
 
-    def evaluate_differences(self, base_transit) :
+    def evaluate_differences(self, base_transit, n_workers: int = 1):
         """
         1. Identifies what routes need to be updated, deleted, or added
         2. For routes being added or updated, identify if the time periods
@@ -187,6 +287,9 @@ class CubeTransit(object):
 
         Args:
             base_transit (CubeTransit): an instance of this class for the base condition
+            n_workers: number of processes to compare the properties and shapes
+                of the routes in both networks with. The changes are returned in
+                the same order whatever the number of processes.
 
         Returns:
             A list of dictionaries containing project card changes
@@ -198,16 +301,35 @@ class CubeTransit(object):
         """
         Identify what needs to be evaluated
         """
-        lines_to_update = [l for l in self.lines if l in base_transit.lines]
-        lines_to_delete = [l for l in base_transit.lines if l not in self.lines]
-        lines_to_add = [l for l in self.lines if l not in base_transit.lines]
+        base_lines = set(base_transit.lines)
+        build_lines = set(self.lines)
+
+        lines_to_update = [l for l in self.lines if l in base_lines]
+        lines_to_delete = [l for l in base_transit.lines if l not in build_lines]
+        lines_to_add = [l for l in self.lines if l not in base_lines]
+
+        # lines with the same properties and shape in both networks have no changes
+        unchanged_lines = set(
+            l
+            for l in lines_to_update
+            if self.line_fingerprint(l) == base_transit.line_fingerprint(l)
+        )
+        WranglerLogger.debug(
+            "{} of {} lines in both networks are unchanged".format(
+                len(unchanged_lines), len(lines_to_update)
+            )
+        )
 
         project_card_changes = []
 
         """
         Evaluate Property Updates
-        """
 
+        Lines for new time periods are added and the properties of other time
+        periods are removed before the properties and shapes are compared,
+        because the cards use the remaining properties.
+        """
+        base_cube_time_period_number_list = []
         for line in lines_to_update:
             WranglerLogger.debug(
                 "Finding differences in time periods for: {}".format(line)
@@ -230,6 +352,7 @@ class CubeTransit(object):
                 raise ValueError(msg)
 
             base_cube_time_period_number = base_cube_time_period_numbers[0]
+            base_cube_time_period_number_list.append(base_cube_time_period_number)
 
             build_cube_time_period_numbers = CubeTransit.get_time_period_numbers_from_cube_properties(
                 self.line_properties[line]
@@ -253,15 +376,43 @@ class CubeTransit(object):
             for tp in time_periods_to_delete:
                 lines_to_delete.append(line)
 
-            WranglerLogger.debug("Evaluating differences in: {}".format(line))
-            updated_properties = self.evaluate_route_property_differences(
-                self.line_properties[line],
-                base_transit.line_properties[line],
-                base_cube_time_period_number,
+            self.remove_other_time_period_properties(
+                self.line_properties[line], base_cube_time_period_number
             )
-            updated_shapes = self.evaluate_route_shape_changes(
-                self.shapes[line], base_transit.shapes[line]
+            self.remove_other_time_period_properties(
+                base_transit.line_properties[line], base_cube_time_period_number
+            )
+
+        jobs = [
+            (line, tp)
+            for line, tp in zip(lines_to_update, base_cube_time_period_number_list)
+            if line not in unchanged_lines
+        ]
+        if n_workers > 1 and len(jobs) > 1:
+            WranglerLogger.debug(
+                "Evaluating differences in {} lines with {} processes".format(
+                    len(jobs), n_workers
+                )
             )
+            with multiprocessing.Pool(
+                processes=n_workers,
+                initializer=_init_transit_diff_worker,
+                initargs=(self, base_transit),
+            ) as pool:
+                line_differences = pool.map(
+                    _evaluate_transit_line_differences,
+                    jobs,
+                    chunksize=max(1, len(jobs) // (4 * n_workers)),
+                )
+        else:
+            line_differences = [
+                self.evaluate_line_differences(base_transit, line, tp)
+                for line, tp in jobs
+            ]
+
+        for (line, _tp), (updated_properties, updated_shapes) in zip(
+            jobs, line_differences
+        ):
             if updated_properties:
                 update_prop_card_dict = self.create_update_route_card_dict(
                     line, updated_properties
@@ -302,6 +453,78 @@ class CubeTransit(object):
 
         return project_card_changes
 
+    def line_fingerprint(self, line: str) -> str:
+        """
+        Returns a hash of a line's properties and node sequence, which is the
+        same for lines that are the same in any network, process or session.
+
+        The node sequence part is kept with the shapes until the line's shape
+        is set again. Line properties can be changed in place, so they are
+        hashed every time.
+
+        Args:
+            line: name of the line
+
+        Returns:
+            A hex digest string.
+        """
+        h = hashlib.sha1()
+        h.update(repr(sorted(self.line_properties[line].items())).encode())
+        h.update(self.shapes.fingerprint(line).encode())
+        return h.hexdigest()
+
+    def evaluate_line_differences(
+        self, base_transit, line: str, time_period_number: str
+    ):
+        """
+        Compares the properties and the shape of a line in this network with
+        the same line in the base network.
+
+        Args:
+            base_transit (CubeTransit): an instance of this class for the base condition
+            line: name of the line in both networks
+            time_period_number: time period of the line in the base network
+
+        Returns:
+            A tuple of the list of property changes and the list of shape
+            changes, or None if the shape is the same.
+        """
+        WranglerLogger.debug("Evaluating differences in: {}".format(line))
+        updated_properties = self.evaluate_route_property_differences(
+            self.line_properties[line],
+            base_transit.line_properties[line],
+            time_period_number,
+        )
+        updated_shapes = self.evaluate_route_shape_changes(
+            self.shapes.nodes(line), base_transit.shapes.nodes(line)
+        )
+        return updated_properties, updated_shapes
+
+    def remove_other_time_period_properties(
+        self, properties: dict, time_period_number: str
+    ):
+        """
+        Removes the time-period-specific properties of the other time periods
+        from a line's properties.
+
+        Args:
+            properties: ::<property_name>: <property_value>
+            time_period_number: time period to keep the properties of
+        """
+        this_time_period_properties_list = [
+            p + "[" + str(time_period_number) + "]"
+            ##todo parameterize all time period specific variables
+            for p in ["HEADWAY", "FREQ"]
+        ]
+
+        not_this_tp_properties_list = list(
+            set(self.parameters.time_period_properties_list)
+            - set(this_time_period_properties_list)
+        )
+
+        for k in not_this_tp_properties_list:
+            properties.pop(k, None)
+
     def add_additional_time_periods(self, new_time_period_number:int, orig_line_name:str)->str:
         """
         Copies a route to another cube time period with appropriate
@@ -345,11 +568,16 @@ class CubeTransit(object):
             WrangerLogger.error(msg)
             raise ValueError(msg)
 
-        # copy to a new line and add it to list of lines to add
-        self.line_properties[new_tp_line_name] = copy.deepcopy(
-            self.line_properties[orig_line_name]
-        )
-        self.shapes[new_tp_line_name] = copy.deepcopy(self.shapes[orig_line_name])
+        # copy to a new line and add it to list of lines to add. The lines share
+        # the original properties and node numbers, and each keeps its own changes.
+        if not isinstance(self.line_properties[orig_line_name], CubeLineProperties):
+            self.line_properties[orig_line_name] = CubeLineProperties(
+                self.line_properties[orig_line_name]
+            )
+        self.line_properties[new_tp_line_name] = self.line_properties[
+            orig_line_name
+        ].copy()
+        self.shapes[new_tp_line_name] = self.shapes.nodes(orig_line_name)
         self.line_properties[new_tp_line_name]["NAME"] = new_tp_line_name
 
         """
@@ -361,14 +589,10 @@ class CubeTransit(object):
             for p in ["HEADWAY", "FREQ"]
         ]
 
-        not_this_tp_properties_list = list(
-            set(self.parameters.time_period_properties_list)
-            - set(this_time_period_properties_list)
+        self.remove_other_time_period_properties(
+            self.line_properties[new_tp_line_name], new_time_period_number
         )
 
-        for k in not_this_tp_properties_list:
-            self.line_properties[new_tp_line_name].pop(k, None)
-
         """
         Remove entries for time period from the original line's properties list.
         """
@@ -475,7 +699,7 @@ class CubeTransit(object):
 
         routing_properties = {
             "property": "routing",
-            "set": self.shapes[line]["node"].tolist(),
+            "set": self.shapes.nodes(line).tolist(),
         }
 
         add_card_dict = {
@@ -684,23 +908,18 @@ class CubeTransit(object):
         """
 
         # Remove time period specific values for things that aren't part of the time period in question
-        this_time_period_properties_list = [
-            p + "[" + str(time_period_number) + "]"
-            ##todo parameterize all time period specific variables
-            for p in ["HEADWAY", "FREQ"]
-        ]
-
-        not_this_tp_properties_list = list(
-            set(self.parameters.time_period_properties_list)
-            - set(this_time_period_properties_list)
-        )
-
-        for k in not_this_tp_properties_list:
-            properties_build.pop(k, None)
-            properties_base.pop(k, None)
-
-        difference_dict = dict(
-            set(properties_build.items()) ^ set(properties_base.items())
+        self.remove_other_time_period_properties(properties_build, time_period_number)
+        self.remove_other_time_period_properties(properties_base, time_period_number)
+
+        # changed and added properties take the build value, and properties
+        # that are only in the base network keep the base value
+        difference_dict = {
+            k: v
+            for k, v in properties_build.items()
+            if k not in properties_base or properties_base[k] != v
+        }
+        difference_dict.update(
+            (k, v) for k, v in properties_base.items() if k not in properties_build
         )
 
         # Iterate through properties list to build difference project card list
@@ -736,71 +955,110 @@ class CubeTransit(object):
         return properties_list
 
     def evaluate_route_shape_changes(
-        self, shape_build: DataFrame, shape_base: DataFrame
+        self,
+        shape_build: Union[DataFrame, np.ndarray],
+        shape_base: Union[DataFrame, np.ndarray],
     ):
         """
         Compares two route shapes and constructs returns list of changes
         suitable for a project card.
 
+        Each changed stretch of the route is a separate routing change, with
+        the two nodes before and the node after it as anchors.
+
         Args:
-            shape_build: DataFrame of the build-version of the route shape.
-            shape_base: dDataFrame of the base-version of the route shape.
+            shape_build: DataFrame or node array of the build-version of the
+                route shape.
+            shape_base: DataFrame or node array of the base-version of the
+                route shape.
 
         Returns:
             List of shape changes formatted as a project card-change dictionary.
 
         """
 
-        if shape_build.node.equals(shape_base.node):
+        if isinstance(shape_base, DataFrame):
+            shape_base = shape_base["node"].values
+        if isinstance(shape_build, DataFrame):
+            shape_build = shape_build["node"].values
+        base_nodes = np.asarray(shape_base)
+        build_nodes = np.asarray(shape_build)
+
+        if np.array_equal(base_nodes, build_nodes):
             return None
 
         shape_change_list = []
+        for (
+            base_start,
+            base_end,
+            build_start,
+            build_end,
+        ) in CubeTransit._shape_diff_hunks(base_nodes, build_nodes):
+            existing = base_nodes[max(base_start - 2, 0) : base_end + 1].tolist()
+            set = build_nodes[max(build_start - 2, 0) : build_end + 1].tolist()
 
-        base_node_list = shape_build.node.tolist()
-        build_node_list = shape_base.node.tolist()
+            shape_change_list.append(
+                {"property": "routing", "existing": existing, "set": set}
+            )
 
-        sort_len = max(len(base_node_list), len(build_node_list))
+        return shape_change_list
 
-        start_pos = None
-        end_pos = None
-        for i in range(sort_len):
-            if (i == len(base_node_list)) | (i == len(build_node_list)):
-                start_pos = i - 1
-                break
-            if base_node_list[i] != build_node_list[i]:
-                start_pos = i
-                break
-            else:
-                continue
+    @staticmethod
+    def _shape_diff_hunks(base_nodes: np.ndarray, build_nodes: np.ndarray) -> list:
+        """
+        Finds the stretches of a route where the base and build node
+        sequences differ.
 
-        j = -1
-        for i in range(sort_len):
-            if (i == len(base_node_list)) | (i == len(build_node_list)):
-                end_pos = j + 1
-                break
-            if base_node_list[j] != build_node_list[j]:
-                end_pos = j
-                break
-            else:
-                j -= 1
+        The common start and end of the routes are found with array
+        comparisons, and only the rest is diffed with difflib. Changes with
+        fewer than three unchanged nodes between them are merged so that
+        their anchor nodes don't overlap.
 
-        if start_pos or end_pos:
-            existing = base_node_list[
-                (start_pos - 2 if start_pos > 1 else None) : (
-                    end_pos + 2 if end_pos < -2 else None
-                )
-            ]
-            set = build_node_list[
-                (start_pos - 2 if start_pos > 1 else None) : (
-                    end_pos + 2 if end_pos < -2 else None
-                )
-            ]
+        Args:
+            base_nodes: node numbers of the base-version of the route.
+            build_nodes: node numbers of the build-version of the route.
 
-            shape_change_list.append(
-                {"property": "routing", "existing": existing, "set": set}
-            )
+        Returns:
+            List of (base start, base end, build start, build end) positions
+            of each changed stretch, with the ends exclusive.
+        """
+        n = min(len(base_nodes), len(build_nodes))
 
-        return shape_change_list
+        mismatch = np.flatnonzero(base_nodes[:n] != build_nodes[:n])
+        prefix = mismatch[0] if len(mismatch) else n
+
+        # don't count nodes in the common start again as part of the common end
+        m = n - prefix
+        mismatch = np.flatnonzero(
+            base_nodes[len(base_nodes) - m :][::-1]
+            != build_nodes[len(build_nodes) - m :][::-1]
+        )
+        suffix = mismatch[0] if len(mismatch) else m
+
+        base_end = len(base_nodes) - suffix
+        build_end = len(build_nodes) - suffix
+
+        if prefix == base_end or prefix == build_end:
+            return [(prefix, base_end, prefix, build_end)]
+
+        matcher = difflib.SequenceMatcher(
+            None,
+            base_nodes[prefix:base_end].tolist(),
+            build_nodes[prefix:build_end].tolist(),
+            autojunk=False,
+        )
+
+        hunks = []
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                continue
+            i1, i2, j1, j2 = i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix
+            if hunks and i1 - hunks[-1][1] < 3:
+                hunks[-1] = (hunks[-1][0], i2, hunks[-1][2], j2)
+            else:
+                hunks.append((i1, i2, j1, j2))
+
+        return hunks
 
 
 class StandardTransit(object):
@@ -818,13 +1076,44 @@ class StandardTransit(object):
         feed: Partridge Feed object containing read-only access to GTFS feed
         parameters (Parameters): Parameters instance containing information
             about time periods and variables.
+        ROUTE_TYPE_TO_CUBE_MODE (dict): Maps GTFS route_type to cube mode
+            numbers. Buses are mode 0 and further disaggregated for cube.
+        GTFS_COLUMNS (dict): Columns of the GTFS tables used to write cube
+            line files, keyed by file name. read_gtfs() only reads these.
     """
 
+    #                 route_type : cube_mode
+    ROUTE_TYPE_TO_CUBE_MODE = {
+        0: 8,  # Tram, Streetcar, Light rail
+        3: 0,  # Bus; further disaggregated for cube
+        2: 9,  # Rail
+    }
+
+    GTFS_COLUMNS = {
+        "agency.txt": ["agency_id"],
+        "routes.txt": [
+            "route_id",
+            "agency_id",
+            "route_short_name",
+            "route_long_name",
+            "route_type",
+        ],
+        "trips.txt": ["route_id", "service_id", "trip_id", "direction_id", "shape_id"],
+        "frequencies.txt": ["trip_id", "start_time", "headway_secs"],
+        "shapes.txt": ["shape_id", "shape_model_node_id"],
+        "stop_times.txt": ["trip_id", "stop_id"],
+        "stops.txt": ["stop_id", "model_node_id"],
+    }
+
     def __init__(self, ptg_feed, parameters={}):
         self.feed = ptg_feed
 
         self.parameters = Parameters(**parameters)
 
+        # feed nodes indexed by shape and trip, see _gtfs_node_index()
+        self._shape_nodes = None
+        self._trip_stop_nodes = None
+
     @staticmethod
     def fromTransitNetwork(transit_network_object: TransitNetwork, parameters: dict = {}):
         """
@@ -841,40 +1130,152 @@ class StandardTransit(object):
         return StandardTransit(transit_network_object.feed, parameters=parameters)
 
     @staticmethod
-    def read_gtfs(gtfs_feed_dir: str, parameters: dict = {}):
+    def read_gtfs(
+        gtfs_feed_dir: str,
+        parameters: dict = {},
+        view: dict = None,
+        service_date: datetime.date = None,
+        all_columns: bool = False,
+    ):
         """
         Reads GTFS files from a directory and returns a StandardTransit
         instance.
 
+        Tables are read when they are first used and, unless all_columns is
+        True or the feed is zipped, only with the columns in GTFS_COLUMNS,
+        the columns partridge links the tables on and the columns filtered
+        on in the view.
+
         Args:
             gtfs_feed_dir: location of the GTFS files
             parameters (Optional): Dictionary of parameter settings. Of not provided will
                 use default parameters.
+            view (Optional): partridge view of the feed to read, as filters of
+                column values keyed by file name, e.g.
+                {"routes.txt": {"agency_id": ["0", "2"]}}
+            service_date (Optional): only reads the trips of the services that
+                run on this date, from calendar.txt and calendar_dates.txt
+            all_columns: if True, reads all columns of the tables
 
         Returns:
             StandardTransit instance
         """
-        return StandardTransit(ptg.load_feed(gtfs_feed_dir), parameters=parameters)
+        view = dict(view or {})
+
+        if service_date:
+            service_ids = ptg.read_service_ids_by_date(gtfs_feed_dir).get(service_date)
+            if not service_ids:
+                msg = "Cannot find services on {} in GTFS feed: {}".format(
+                    service_date, gtfs_feed_dir
+                )
+                WranglerLogger.error(msg)
+                raise ValueError(msg)
+            view["trips.txt"] = dict(view.get("trips.txt", {}), service_id=service_ids)
+
+        if all_columns or not os.path.isdir(gtfs_feed_dir):
+            feed = ptg.load_feed(gtfs_feed_dir, view=view)
+        else:
+            feed = _load_gtfs_feed(gtfs_feed_dir, view, StandardTransit.GTFS_COLUMNS)
+
+        return StandardTransit(feed, parameters=parameters)
 
-    def write_as_cube_lin(self, outpath: str  = None):
+    def write_as_cube_lin(self, outpath: str = None, chunk_size: int = 2 ** 20):
         """
         Writes the gtfs feed as a cube line file after
         converting gtfs properties to MetCouncil cube properties.
 
+        Lines are converted trip by trip and written in chunks on a
+        background thread while the next chunk is converted, so the file
+        is never held in memory as a whole. Files ending in ".gz" are
+        written with gzip compression.
+
         Args:
             outpath: File location for output cube line file.
+            chunk_size: Approximate number of characters written at a time.
 
         """
         if not outpath:
-            outpath  = os.path.join(self.parameters.scratch_location,"outtransit.lin")
+            outpath = os.path.join(self.parameters.scratch_location, "outtransit.lin")
         trip_cube_df = self.route_properties_gtfs_to_cube(self)
 
-        trip_cube_df["LIN"] = trip_cube_df.apply(self.cube_format, axis=1)
+        open_lin = gzip.open if outpath.endswith(".gz") else open
+
+        with open_lin(outpath, "wt") as f, ThreadPoolExecutor(max_workers=1) as writer:
+            writes = deque()
+            for chunk in self._cube_lin_chunks(trip_cube_df, chunk_size):
+                writes.append(writer.submit(f.write, chunk))
+                # don't let converted chunks pile up behind a slow write
+                if len(writes) > 2:
+                    writes.popleft().result()
+            for write in writes:
+                write.result()
+
+    def _cube_lin_chunks(self, trip_cube_df: DataFrame, chunk_size: int):
+        """
+        Generates the text of a cube line file in chunks.
+
+        Args:
+            trip_cube_df: DataFrame of cube-formatted trips from
+                route_properties_gtfs_to_cube()
+            chunk_size: Approximate number of characters in a chunk.
+
+        Yields:
+            Chunks of cube line file text, each with one or more whole lines.
+        """
+        trip_cube_df = trip_cube_df[
+            [
+                "trip_id",
+                "shape_id",
+                "NAME",
+                "LONGNAME",
+                "tod",
+                "HEADWAY",
+                "MODE",
+                "ONEWAY",
+                "OPERATOR",
+            ]
+        ]
 
-        l = trip_cube_df["LIN"].tolist()
+        # the properties part of each line is built for all trips at once,
+        # only the node lists are made trip by trip
+        line_headers = (
+            '\nLINE NAME="'
+            + trip_cube_df["NAME"].map(str)
+            + '",\n LONGNAME="'
+            + trip_cube_df["LONGNAME"].map(str)
+            + '",\n HEADWAY['
+            + trip_cube_df["tod"].map(str)
+            + "]="
+            + trip_cube_df["HEADWAY"].map(str)
+            + ",\n MODE="
+            + trip_cube_df["MODE"].map(str)
+            + ",\n ONEWAY="
+            + trip_cube_df["ONEWAY"].map(str)
+            + ",\n OPERATOR="
+            + trip_cube_df["OPERATOR"].map(str)
+            + ",\n NODES="
+        )
 
-        with open(outpath, "w") as f:
-            f.write("\n".join(l))
+        lines = []
+        size = 0
+        separator = ""
+        for line_header, shape_id, trip_id in zip(
+            line_headers.values,
+            trip_cube_df["shape_id"].values,
+            trip_cube_df["trip_id"].values,
+        ):
+            line = separator + line_header + self._trip_nodes_cube(shape_id, trip_id)
+            separator = "\n"
+            lines.append(line)
+            size += len(line)
+
+            if size >= chunk_size:
+                yield "".join(lines)
+                lines = []
+                size = 0
+
+        if lines:
+            yield "".join(lines)
 
     @staticmethod
     def route_properties_gtfs_to_cube(self):
@@ -918,7 +1319,6 @@ class StandardTransit(object):
             "15": 3,
         }
 
-        shape_df = self.feed.shapes.copy()
         trip_df = self.feed.trips.copy()
 
         """
@@ -927,23 +1327,22 @@ class StandardTransit(object):
         trip_df = pd.merge(trip_df, self.feed.routes, how="left", on="route_id")
         trip_df = pd.merge(trip_df, self.feed.frequencies, how="left", on="trip_id")
 
-        trip_df["tod"] = trip_df.start_time.apply(self.time_to_cube_time_period)
+        trip_df["tod"] = self.time_to_cube_time_periods(trip_df.start_time.values)
 
-        trip_df["NAME"] = trip_df.apply(
-            lambda x: x.agency_id
+        trip_df["NAME"] = (
+            trip_df["agency_id"]
             + "_"
-            + x.route_id
+            + trip_df["route_id"]
             + "_"
-            + x.route_short_name
+            + trip_df["route_short_name"]
             + "_"
-            + x.tod
-            + str(x.direction_id),
-            axis=1,
+            + trip_df["tod"]
+            + trip_df["direction_id"].astype(str)
         )
 
         trip_df["LONGNAME"] = trip_df["route_long_name"]
         trip_df["HEADWAY"] = (trip_df["headway_secs"] / 60).astype(int)
-        trip_df["MODE"] = trip_df.apply(self.calculate_cube_mode, axis=1)
+        trip_df["MODE"] = self.calculate_cube_modes(trip_df)
         trip_df["ONEWAY"] = "T"
         trip_df["OPERATOR"] = trip_df["agency_id"].map(metro_operator_dict)
 
@@ -980,14 +1379,7 @@ class StandardTransit(object):
         Returns:
             cube mode number
         """
-        #                 route_type : cube_mode
-        route_type_to_cube_mode = {
-            0: 8,  # Tram, Streetcar, Light rail
-            3: 0,  # Bus; further disaggregated for cube
-            2: 9,
-        }  # Rail
-
-        cube_mode = route_type_to_cube_mode[row["route_type"]]
+        cube_mode = self.ROUTE_TYPE_TO_CUBE_MODE[row["route_type"]]
 
         if not cube_mode:
             if "express" in row["route_long_name"].lower():
@@ -999,6 +1391,50 @@ class StandardTransit(object):
 
         return cube_mode
 
+    def calculate_cube_modes(self, trip_df: DataFrame) -> pd.Series:
+        """
+        Assigns cube mode numbers to all trips at once, with the same
+        logic as calculate_cube_mode().
+
+        Args:
+            trip_df: DataFrame of trips with route_type, route_long_name,
+                and route_id
+
+        Returns:
+            Series of cube mode numbers with the index of trip_df
+        """
+        cube_mode = trip_df["route_type"].map(self.ROUTE_TYPE_TO_CUBE_MODE)
+
+        if cube_mode.isnull().any():
+            msg = "Cannot find cube mode in {} for route_type: {}".format(
+                self.ROUTE_TYPE_TO_CUBE_MODE,
+                ", ".join(map(str, trip_df["route_type"][cube_mode.isnull()].unique())),
+            )
+            WranglerLogger.error(msg)
+            raise ValueError(msg)
+
+        is_bus = cube_mode == 0
+        is_express = is_bus & (
+            trip_df["route_long_name"]
+            .str.lower()
+            .str.contains("express", regex=False, na=False)
+        )
+        is_local = is_bus & ~is_express
+
+        # route number is only needed for local buses
+        route_number = pd.Series(0, index=trip_df.index)
+        route_number[is_local] = pd.to_numeric(
+            trip_df.loc[is_local, "route_id"].str.split("-", n=1).str[0]
+        )
+
+        cube_mode = np.select(
+            [is_express, is_local & (route_number > 99), is_local],
+            [7, 6, 5],  # Express, Suburban Local, Urban Local
+            default=cube_mode.astype(int),
+        )
+
+        return pd.Series(cube_mode, index=trip_df.index)
+
     def time_to_cube_time_period(
         self, start_time_secs: int, as_str: bool = True, verbose: bool = False
     ):
@@ -1017,53 +1453,109 @@ class StandardTransit(object):
             this_tp: if as_str is True, returns the Cube time period
                 name abbreviation
         """
-        from .util import hhmmss_to_datetime, secs_to_datetime
-
-        # set initial time as the time that spans midnight
-
-        start_time_dt = secs_to_datetime(start_time_secs)
-
-        # set initial time as the time that spans midnight
-        this_tp = "NA"
-        for tp_name, _times in self.parameters.time_period_to_time.items():
-            _start_time, _end_time = _times
-            _dt_start_time = hhmmss_to_datetime(_start_time)
-            _dt_end_time = hhmmss_to_datetime(_end_time)
-            if _dt_start_time > _dt_end_time:
-                this_tp = tp_name
-                break
-
-        for tp_name, _times in self.parameters.time_period_to_time.items():
-            _start_time, _end_time = _times
-            _dt_start_time = hhmmss_to_datetime(_start_time)
-            if start_time_dt >= _dt_start_time:
-                this_time = _dt_start_time
-                this_tp = tp_name
+        this_tp = self.time_to_cube_time_periods([start_time_secs], as_str=as_str)[0]
 
         if verbose:
             WranglerLogger.debug(
                 "Finding Cube Time Period from Start Time: \
                 \n  - start_time_sec: {} \
-                \n  - start_time_dt: {} \
                 \n  - this_tp: {}".format(
-                    start_time_secs, start_time_dt, this_tp
+                    start_time_secs, this_tp
                 )
             )
 
+        return this_tp
+
+    def time_to_cube_time_periods(self, start_times_secs, as_str: bool = True):
+        """
+        Converts an array of seconds from midnight to cube time periods.
+
+        Each start time is found in the time period start times of
+        parameters.time_period_to_time with a binary search. Start times
+        before the earliest period start are in the period that spans
+        midnight, and start times past 24:00:00 are taken from the next
+        midnight. Missing start times are in time period "NA".
+
+        Args:
+            start_times_secs: array-like of start times for transit trips
+                in seconds from midnight
+            as_str: if True, returns the time periods as strings,
+                otherwise returns numeric time periods
+
+        Returns:
+            numpy array of the numeric time periods if as_str is False,
+            otherwise of the Cube time period name abbreviations
+        """
+        tp_starts, tp_names = _time_period_breakpoints(
+            tuple(
+                (tp_name, tuple(_times))
+                for tp_name, _times in self.parameters.time_period_to_time.items()
+            )
+        )
+
+        start_times_secs = np.asarray(start_times_secs, dtype=float)
+        missing = np.isnan(start_times_secs)
+
+        # index 0 is the time period that spans midnight
+        tp_idx = np.searchsorted(
+            tp_starts, np.mod(start_times_secs, 24 * 60 * 60), side="right"
+        )
+
+        this_tps = tp_names[tp_idx]
+        this_tps[missing] = "NA"
+
         if as_str:
-            return this_tp
+            return this_tps
 
-        name_to_num = {v: k for k, v in self.parameters.cube_time_periods.items}
-        this_tp_num = name_to_num.get(this_tp)
+        name_to_num = {v: k for k, v in self.parameters.cube_time_periods.items()}
+        this_tp_nums = pd.Series(this_tps).map(name_to_num).values
 
-        if not this_tp_num:
+        unknown_tps = set(this_tps[pd.isnull(this_tp_nums)])
+        if unknown_tps:
             msg = "Cannot find time period number in {} for time period name: {}".format(
-                name_to_num, this_tp
+                name_to_num, ", ".join(sorted(unknown_tps))
             )
             WranglerLogger.error(msg)
             raise ValueError(msg)
 
-        return this_tp_num
+        return this_tp_nums
+
+    def _gtfs_node_index(self):
+        """
+        Indexes the feed's shape nodes by shape and its stop nodes by trip,
+        so the node list of each trip doesn't need to search the whole feed.
+
+        Returns:
+            A tuple of a dictionary of the node numbers and their strings keyed
+            by shape_id, in feed order, and a dictionary of the stop node
+            numbers keyed by trip_id.
+        """
+        if self._shape_nodes is None:
+            shape_df = self.feed.shapes
+            shape_node_ids = shape_df["shape_model_node_id"].values
+            shape_node_strs = shape_df["shape_model_node_id"].astype(str).values
+            self._shape_nodes = {
+                shape_id: (shape_node_ids[idx], shape_node_strs[idx])
+                for shape_id, idx in shape_df.groupby(
+                    "shape_id", sort=False
+                ).indices.items()
+            }
+
+            stop_times_df = pd.merge(
+                self.feed.stop_times[["trip_id", "stop_id"]],
+                self.feed.stops[["stop_id", "model_node_id"]],
+                how="left",
+                on="stop_id",
+            )
+            stop_node_ids = stop_times_df["model_node_id"].values
+            self._trip_stop_nodes = {
+                trip_id: stop_node_ids[idx]
+                for trip_id, idx in stop_times_df.groupby(
+                    "trip_id", sort=False
+                ).indices.items()
+            }
+
+        return self._shape_nodes, self._trip_stop_nodes
 
     def shape_gtfs_to_cube(self, row):
         """
@@ -1077,34 +1569,24 @@ class StandardTransit(object):
             for a route in cube format.
 
         """
-        trip_stop_times_df = self.feed.stop_times.copy()
-        trip_stop_times_df = trip_stop_times_df[
-            trip_stop_times_df.trip_id == row.trip_id
-        ]
+        return self._trip_nodes_cube(row.shape_id, row.trip_id)
 
-        trip_node_df = self.feed.shapes.copy()
-        trip_node_df = trip_node_df[trip_node_df.shape_id == row.shape_id]
-
-        trip_stop_times_df = pd.merge(
-            trip_stop_times_df, self.feed.stops, how="left", on="stop_id"
-        )
+    def _trip_nodes_cube(self, shape_id, trip_id) -> str:
+        """
+        Creates the cube node list string of a trip from its shape and
+        stops, as in shape_gtfs_to_cube().
+        """
+        shape_nodes, trip_stop_nodes = self._gtfs_node_index()
 
-        stop_node_id_list = trip_stop_times_df["model_node_id"].tolist()
-        trip_node_list = trip_node_df["shape_model_node_id"].tolist()
+        empty = np.array([], dtype=object)
+        trip_node_ids, trip_node_strs = shape_nodes.get(shape_id, (empty, empty))
+        stop_node_ids = trip_stop_nodes.get(trip_id, empty)
 
-        # node list
-        node_list_str = ""
-        for nodeIdx in range(len(trip_node_list)):
-            if trip_node_list[nodeIdx] in stop_node_id_list:
-                node_list_str += "\n %s" % (trip_node_list[nodeIdx])
-                if nodeIdx < (len(trip_node_list) - 1):
-                    node_list_str += ","
-            else:
-                node_list_str += "\n -%s" % (trip_node_list[nodeIdx])
-                if nodeIdx < (len(trip_node_list) - 1):
-                    node_list_str += ","
+        # stops are positive and other nodes are negative
+        is_stop = pd.Series(trip_node_ids).isin(stop_node_ids).values
+        node_strs = np.where(is_stop, "\n ", "\n -").astype(object) + trip_node_strs
 
-        return node_list_str
+        return ",".join(node_strs)
 
     def cube_format(self, row):
         """
@@ -1129,6 +1611,275 @@ class StandardTransit(object):
         return s
 
 
+class CubeShapes(MutableMapping):
+    """
+    Route shapes of cube transit lines, keyed by line name.
+
+    Node numbers of all lines are kept in shared, read-only int64 arrays
+    and each line is an offset range into one of them, so adding, copying and
+    comparing lines doesn't create a DataFrame per line.
+
+    .. highlight:: python
+    Typical usage example:
+    ::
+        shapes = CubeShapes.from_node_lists({"a": [1, -2, 3], "b": [3, 4]})
+        shapes["a"].node.tolist()
+        >> [1, -2, 3]
+
+    Looking up a line returns a DataFrame of its nodes with the columns:
+      - 'node_id' (int): positive integer of node id
+      - 'node' (int): node number, with negative indicating a non-stop
+      - 'stop' (boolean): indicates if it is a stop
+      - 'order' (int):  order within this shape
+
+    The DataFrame is built on every lookup and is not kept, so editing it in
+    place doesn't change the shape. Set the line again to keep the edits:
+    ::
+        shape = shapes["a"]
+        shape.loc[0, "node"] = 5
+        shapes["a"] = shape
+
+    A line can be set from a DataFrame or Series of nodes or from a sequence of
+    node numbers. Use :py:meth:`nodes` when only the node numbers are needed.
+    """
+
+    def __init__(self):
+        # line name: (node array, start offset, end offset)
+        self._index = {}
+        # line name: hash of the node numbers, see fingerprint()
+        self._fingerprints = {}
+
+    @classmethod
+    def from_node_lists(cls, node_lists: dict):
+        """
+        Creates shapes that share one node array from lists of node numbers.
+
+        Args:
+            node_lists: sequences of node numbers keyed by line name.
+
+        Returns:
+            CubeShapes
+        """
+        shapes = cls()
+        lengths = [len(n) for n in node_lists.values()]
+        if not lengths:
+            return shapes
+
+        nodes = np.fromiter(
+            (n for line_nodes in node_lists.values() for n in line_nodes),
+            dtype=np.int64,
+            count=sum(lengths),
+        )
+        nodes.flags.writeable = False
+
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        for line, start, end in zip(node_lists, offsets[:-1], offsets[1:]):
+            shapes._index[line] = (nodes, int(start), int(end))
+        return shapes
+
+    def nodes(self, line: str) -> np.ndarray:
+        """
+        Returns a read-only view of the node numbers of a line, with negative
+        numbers indicating non-stops.
+
+        Args:
+            line: line name
+
+        Returns:
+            numpy array of node numbers
+        """
+        nodes, start, end = self._index[line]
+        line_nodes = nodes[start:end]
+        line_nodes.flags.writeable = False
+        return line_nodes
+
+    def fingerprint(self, line: str) -> str:
+        """
+        Returns a hash of the node numbers of a line, which is the same in
+        every process and session. It is kept until the line is set again.
+
+        Args:
+            line: line name
+
+        Returns:
+            A hex digest string.
+        """
+        if line not in self._fingerprints:
+            self._fingerprints[line] = hashlib.sha1(
+                self.nodes(line).tobytes()
+            ).hexdigest()
+        return self._fingerprints[line]
+
+    def __getitem__(self, line: str) -> DataFrame:
+        """
+        Returns a new DataFrame of a line's nodes. Edits to it are not kept
+        unless it is assigned back with ``shapes[line] = df``.
+        """
+        line_nodes = self.nodes(line)
+        return DataFrame(
+            {
+                "node_id": np.abs(line_nodes),
+                "node": line_nodes,
+                "stop": line_nodes > 0,
+                "order": np.arange(1, len(line_nodes) + 1, dtype=np.int64),
+            }
+        )
+
+    def __setitem__(self, line: str, shape) -> None:
+        if isinstance(shape, DataFrame):
+            shape = shape["node"]
+        if isinstance(shape, pd.Series):
+            shape = shape.values
+        if isinstance(shape, np.ndarray) and not shape.flags.writeable:
+            # read-only node arrays are shared rather than copied
+            nodes = shape.astype(np.int64, copy=False)
+        else:
+            nodes = np.array(shape, dtype=np.int64)
+        nodes.flags.writeable = False
+        self._index[line] = (nodes, 0, len(nodes))
+        self._fingerprints.pop(line, None)
+
+    def __delitem__(self, line: str) -> None:
+        del self._index[line]
+        self._fingerprints.pop(line, None)
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, line) -> bool:
+        return line in self._index
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, CubeShapes):
+            return NotImplemented
+        return self._index.keys() == other._index.keys() and all(
+            np.array_equal(self.nodes(line), other.nodes(line)) for line in self
+        )
+
+    def update(self, other=(), **kwargs) -> None:
+        """
+        Adds the lines of another mapping of shapes. Lines of other
+        CubeShapes are added without copying their nodes.
+        """
+        if isinstance(other, CubeShapes):
+            for line in other._index:
+                self._fingerprints.pop(line, None)
+            self._index.update(other._index)
+            self._fingerprints.update(other._fingerprints)
+        else:
+            super().update(other)
+        for line, shape in kwargs.items():
+            self[line] = shape
+
+    def copy(self):
+        """
+        Returns a copy of the shapes. Node arrays are read-only, so they
+        are shared with the copy.
+        """
+        shapes = CubeShapes()
+        shapes._index = self._index.copy()
+        shapes._fingerprints = self._fingerprints.copy()
+        return shapes
+
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def __setstate__(self, state):
+        # node arrays are writeable again once unpickled
+        self._fingerprints = {}
+        self.__dict__.update(state)
+        for nodes, _start, _end in self._index.values():
+            nodes.flags.writeable = False
+
+    def __repr__(self) -> str:
+        return "CubeShapes({} lines)".format(len(self))
+
+
+class CubeLineProperties(MutableMapping):
+    """
+    Properties of a cube transit line that are shared with the other time
+    periods of the same line.
+
+    Properties are read from a base dictionary that is shared by the lines and
+    never changed. Setting or deleting a property only changes this line and
+    only the changes are stored, so a line for another time period stores its
+    name and HEADWAY or FREQ rather than a copy of every property. Properties
+    are kept in the same order as they would be in a dictionary.
+
+    .. highlight:: python
+    Typical usage example:
+    ::
+        am_properties = CubeLineProperties(line_properties)
+        pm_properties = am_properties.copy()
+        pm_properties["HEADWAY[2]"] = 20
+    """
+
+    def __init__(self, base: dict):
+        self._base = base
+        # properties set on this line
+        self._set = {}
+        # base properties that were deleted from this line
+        self._deleted = set()
+        # properties not in their base position, in the order they were added
+        self._added = {}
+
+    def __getitem__(self, k):
+        if k in self._set:
+            return self._set[k]
+        if k in self._base and k not in self._deleted:
+            return self._base[k]
+        raise KeyError(k)
+
+    def __setitem__(self, k, v) -> None:
+        if k not in self._base or k in self._deleted:
+            self._added[k] = None
+        self._set[k] = v
+
+    def __delitem__(self, k) -> None:
+        if k in self._added:
+            del self._added[k]
+        elif k in self._base and k not in self._deleted:
+            self._deleted.add(k)
+        else:
+            raise KeyError(k)
+        self._set.pop(k, None)
+
+    def __iter__(self):
+        for k in self._base:
+            if k not in self._deleted:
+                yield k
+        yield from self._added
+
+    def __len__(self) -> int:
+        return len(self._base) - len(self._deleted) + len(self._added)
+
+    def __contains__(self, k) -> bool:
+        return k in self._set or (k in self._base and k not in self._deleted)
+
+    def copy(self):
+        """
+        Returns a copy that shares the base properties.
+        """
+        properties = CubeLineProperties(self._base)
+        properties._set = self._set.copy()
+        properties._deleted = self._deleted.copy()
+        properties._added = self._added.copy()
+        return properties
+
+    def __copy__(self):
+        return self.copy()
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
+
 class CubeTransformer(Transformer):
     """A lark-parsing Transformer which transforms the parse-tree to
     a dictionary.
@@ -1144,6 +1895,13 @@ class CubeTransformer(Transformer):
         lines_list (list): a list of the line names
     """
     def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """
+        Clears the state kept between callbacks so the transformer can be
+        reused for another line file.
+        """
         self.line_order = 0
         self.lines_list = []
 
@@ -1198,7 +1956,6 @@ class CubeTransformer(Transformer):
             return attr_value[0].value
 
     def nodes(self, lin_node):
-        lin_node = DataFrame(lin_node)
         # WranglerLogger.debug("nodes:\n {}".format(lin_node))
 
         return lin_node
@@ -1206,8 +1963,7 @@ class CubeTransformer(Transformer):
     @v_args(inline=True)
     def lin_node(self, NODE_NUM, SEMICOLON_COMMENT=None, *lin_nodeattr):
         self.line_order += 1
-        n = int(NODE_NUM.value)
-        return {"node_id": abs(n), "node": n, "stop": n > 0, "order": self.line_order}
+        return int(NODE_NUM.value)
 
     start = dict
 
@@ -1270,3 +2026,416 @@ opmode_attr_name  : "number" | "name" | "longname"
 %ignore WS
 
 """
+
+# parsers built from TRANSIT_LINE_FILE_GRAMMAR, keyed by the file they are cached in
+# and whether they apply the CubeTransformer while parsing
+_TRANSIT_LINE_FILE_PARSERS = {}
+
+
+# Patterns for the subset of TRANSIT_LINE_FILE_GRAMMAR read by _scan_transit_lines.
+# Whitespace, strings and comments are the same as the grammar's terminals.
+_LIN_WS = r"[ \t\f\r\n]*"
+_LIN_COMMENT = r";[^\n]*"
+_LIN_STRING = r"""(?:"(?!"").*?(?<!\\)(?:\\\\)*?"|'(?!'').*?(?<!\\)(?:\\\\)*?')"""
+
+_LIN_PROGRAM_TYPE_RE = re.compile(
+    _LIN_WS + r";;<<(?P<program_type>PT|TRNBUILD)>><<LINE>>;;" + _LIN_WS
+)
+_LIN_LINE_RE = re.compile(r"LINE" + _LIN_WS)
+_LIN_ATTR_NAME_RE = re.compile(
+    r"(?i:(?P<tp_name>freq|headway)\[(?P<time_period>[1-5])\]"
+    r"|(?P<name>allstops|color|mode|name|oneway|owner|runtime|timefac|xyspeed"
+    r"|longname|shortname|vehicletype|operator|faresystem))" + _LIN_WS + "=" + _LIN_WS
+)
+_LIN_ATTR_VALUE_RE = re.compile(r"[TtFf]|" + _LIN_STRING + r"|[+-]?\d+")
+_LIN_ATTR_END_RE = re.compile(
+    _LIN_WS + "," + _LIN_WS + "(?:" + _LIN_COMMENT + _LIN_WS + ")?"
+)
+_LIN_NODE = (
+    r"(?:(?:NODES|N)"
+    + _LIN_WS
+    + r")?(?:="
+    + _LIN_WS
+    + r")?(?P<node>[+-]?\d+)"
+    + _LIN_WS
+    + r"(?:,"
+    + _LIN_WS
+    + r")?(?:"
+    + _LIN_COMMENT
+    + _LIN_WS
+    + r")?"
+)
+_LIN_NODE_RE = re.compile(_LIN_NODE)
+_LIN_NODES_RE = re.compile("(?:" + _LIN_NODE + ")+")
+
+
+def _scan_transit_lines(lin: str):
+    """
+    Reads the text of a cube line file that only uses the common subset of
+    TRANSIT_LINE_FILE_GRAMMAR: a program type line, then lines made of line
+    attributes and lists of signed node numbers, with an optional comment
+    after each attribute and node.
+
+    Gives the same line properties and node numbers as parsing the text with
+    the full grammar and the CubeTransformer.
+
+    Args:
+        lin: text of a cube line file
+
+    Returns:
+        A tuple of the program type, the line properties keyed by line name
+        and lists of node numbers keyed by line name, or None if the text
+        uses anything else, such as node attributes, and has to be parsed with
+        the full grammar.
+    """
+    m = _LIN_PROGRAM_TYPE_RE.match(lin)
+    if not m:
+        return None
+    program_type = m.group("program_type")
+    pos = m.end()
+
+    line_properties_dict = {}
+    line_nodes_dict = {}
+    while pos < len(lin):
+        m = _LIN_LINE_RE.match(lin, pos)
+        if not m:
+            return None
+        pos = m.end()
+
+        line_properties = {}
+        m = _LIN_ATTR_NAME_RE.match(lin, pos)
+        while m:
+            if m.group("name"):
+                attr_name = m.group("name").upper()
+            else:
+                attr_name = "{}[{}]".format(
+                    m.group("tp_name").upper(), m.group("time_period")
+                )
+
+            v = _LIN_ATTR_VALUE_RE.match(lin, m.end())
+            if not v:
+                return None
+            end = _LIN_ATTR_END_RE.match(lin, v.end())
+            if not end:
+                return None
+
+            try:
+                line_properties[attr_name] = int(v.group())
+            except ValueError:
+                line_properties[attr_name] = v.group()
+            pos = end.end()
+            m = _LIN_ATTR_NAME_RE.match(lin, pos)
+
+        m = _LIN_NODES_RE.match(lin, pos)
+        if not line_properties or "NAME" not in line_properties or not m:
+            return None
+        pos = m.end()
+
+        line_name = line_properties["NAME"]
+        line_properties_dict[line_name] = line_properties
+        line_nodes_dict[line_name] = [
+            int(n) for n in _LIN_NODE_RE.findall(lin, m.start(), m.end())
+        ]
+
+    return program_type, line_properties_dict, line_nodes_dict
+
+
+# networks compared by the processes of CubeTransit.evaluate_differences
+_diff_transit = None
+_diff_base_transit = None
+
+
+def _init_transit_diff_worker(transit, base_transit):
+    global _diff_transit, _diff_base_transit
+    _diff_transit = transit
+    _diff_base_transit = base_transit
+
+
+def _evaluate_transit_line_differences(job):
+    line, time_period_number = job
+    return _diff_transit.evaluate_line_differences(
+        _diff_base_transit, line, time_period_number
+    )
+
+
+def _parse_transit_lines(lin: str, parser_cache: Optional[str] = None):
+    """
+    Parses the text of a cube line file. Files that only use the constructs
+    handled by :py:func:`_scan_transit_lines` are read with it, and other files
+    with the parser for TRANSIT_LINE_FILE_GRAMMAR.
+
+    Args:
+        lin: text of a cube line file
+        parser_cache: file path of a serialized transit line file parser
+
+    Returns:
+        A tuple of the program type, the line properties keyed by line name
+        and the line shapes keyed by line name.
+    """
+    scanned_lines = _scan_transit_lines(lin)
+    if scanned_lines is not None:
+        program_type, line_properties_dict, line_nodes_dict = scanned_lines
+        return (
+            program_type,
+            line_properties_dict,
+            CubeShapes.from_node_lists(line_nodes_dict),
+        )
+
+    WranglerLogger.debug("parsing cube line file with the full grammar")
+    parser = CubeTransit.get_parser(cache=parser_cache, transform=True)
+
+    # the transformer is applied while parsing and is shared by every parse
+    parser.options.transformer.reset()
+    transformed_tree_data = parser.parse(lin)
+
+    WranglerLogger.debug("finished parsing cube line file")
+    # WranglerLogger.debug("--Transformed Tree Data --\n {}".format(transformed_tree_data["lines"]))
+
+    line_properties_dict = {
+        k: v["line_properties"] for k, v in transformed_tree_data["lines"].items()
+    }
+    line_shapes_dict = CubeShapes.from_node_lists(
+        {k: v["line_shape"] for k, v in transformed_tree_data["lines"].items()}
+    )
+
+    return transformed_tree_data["program_type"], line_properties_dict, line_shapes_dict
+
+
+def _read_transit_line_file(job):
+    """
+    Reads and parses a cube line file. Takes a single tuple so that it can
+    be mapped over a process pool.
+
+    Args:
+        job: tuple of the cube line file path and the parser cache file path
+
+    Returns:
+        A tuple of the program type, the line properties keyed by line name
+        and the line shapes keyed by line name.
+    """
+    lin_file, parser_cache = job
+    with open(lin_file) as file:
+        return _parse_transit_lines(file.read(), parser_cache)
+
+
+def _read_transit_line_files(
+    lin_files: list,
+    parser_cache: Optional[str] = None,
+    n_workers: int = 1,
+    cache_dir: Optional[str] = None,
+) -> list:
+    """
+    Reads and parses cube line files, taking the ones that were parsed
+    before from the cache folder.
+
+    Args:
+        lin_files: cube line file paths
+        parser_cache: file path of a serialized transit line file parser
+        n_workers: number of processes to parse the files that aren't cached with
+        cache_dir: folder for the parsed lines of cube line files, or None to
+            parse every file
+
+    Returns:
+        A list of tuples of the program type, the line properties keyed by line
+        name and the line shapes keyed by line name, in the order of lin_files.
+    """
+    parsed_lines_list = [None] * len(lin_files)
+    cache_paths = [None] * len(lin_files)
+
+    if cache_dir:
+        for i, lin_file in enumerate(lin_files):
+            cache_paths[i] = os.path.join(
+                cache_dir, _transit_line_file_cache_key(lin_file) + ".pkl"
+            )
+            parsed_lines_list[i] = read_cache_pickle(cache_paths[i])
+            if parsed_lines_list[i] is not None:
+                WranglerLogger.debug(
+                    "Reading parsed transit line file {} from cache: {}".format(
+                        lin_file, cache_paths[i]
+                    )
+                )
+
+    to_parse = [i for i, p in enumerate(parsed_lines_list) if p is None]
+    jobs = [(lin_files[i], parser_cache) for i in to_parse]
+
+    if n_workers > 1 and len(jobs) > 1:
+        WranglerLogger.debug(
+            "parsing {} transit line files with {} processes".format(
+                len(jobs), min(n_workers, len(jobs))
+            )
+        )
+        with multiprocessing.Pool(min(n_workers, len(jobs))) as pool:
+            parsed = pool.map(_read_transit_line_file, jobs, chunksize=1)
+    else:
+        parsed = map(_read_transit_line_file, jobs)
+
+    for i, parsed_lines in zip(to_parse, parsed):
+        parsed_lines_list[i] = parsed_lines
+        if cache_dir:
+            _write_transit_line_file_cache(parsed_lines, cache_paths[i])
+
+    return parsed_lines_list
+
+
+def _transit_line_file_cache_key(lin_file: str) -> str:
+    """
+    Creates the cache key of a parsed cube line file from its contents, the
+    grammar, the cache version and the library versions (see
+    lasso.util.cache_key_hash), so it doesn't depend on where the file is.
+
+    Args:
+        lin_file: cube line file path
+
+    Returns:
+        A hex digest string.
+    """
+    h = cache_key_hash(CubeTransit.TRANSIT_LINE_FILE_CACHE_VERSION)
+    h.update(TRANSIT_LINE_FILE_GRAMMAR.encode())
+    update_hash_with_file(h, lin_file)
+    return h.hexdigest()
+
+
+def _write_transit_line_file_cache(parsed_lines: tuple, cache_path: str):
+    """
+    Writes the parsed lines of a cube line file to the cache folder.
+
+    Args:
+        parsed_lines: tuple of the program type, line properties and line shapes
+        cache_path: file path of the cache entry
+    """
+    if write_cache_pickle(parsed_lines, cache_path):
+        WranglerLogger.debug(
+            "Wrote parsed transit line file to cache: {}".format(cache_path)
+        )
+    else:
+        WranglerLogger.warning(
+            "Couldn't write transit line file cache: {}".format(cache_path)
+        )
+
+
+class _GtfsFeed(ptg.gtfs.Feed):
+    """
+    partridge Feed that only reads some of the columns of GTFS tables.
+
+    This overrides Feed._read_csv and follows the loading steps of
+    partridge.load_feed(), which aren't part of the public API of partridge,
+    so requirements.txt pins the partridge releases it was written for.
+    """
+
+    def __init__(self, source, config=None, columns: dict = {}):
+        """
+        Args:
+            source: location of the GTFS files
+            config: partridge config of the feed
+            columns: lists of the columns to read keyed by file name. All
+                columns of other files are read.
+        """
+        super().__init__(source, config=config)
+        self._columns = columns
+
+    def _read_csv(self, filename: str) -> pd.DataFrame:
+        path = self._pathmap.get(filename)
+        columns = self._columns.get(filename)
+
+        if columns is None or path is None or os.path.getsize(path) == 0:
+            return super()._read_csv(filename)
+
+        with open(path, "rb") as f:
+            encoding = ptg.utilities.detect_encoding(f)
+
+        df = pd.read_csv(
+            path,
+            dtype=str,
+            encoding=encoding,
+            index_col=False,
+            usecols=lambda c: c.strip() in columns,
+        )
+
+        # Strip whitespace from column names and values, as partridge does
+        df.rename(columns=lambda x: x.strip(), inplace=True)
+        for col in df.columns:
+            df[col] = df[col].str.strip()
+
+        return df
+
+
+def _load_gtfs_feed(gtfs_feed_dir: str, view: dict, columns: dict):
+    """
+    Loads a GTFS feed like partridge.load_feed(), reading only the given
+    columns of the tables they are given for.
+
+    Columns that are filtered on in the view or that partridge uses to
+    link tables are always read.
+
+    Args:
+        gtfs_feed_dir: location of the GTFS files
+        view: partridge view of the feed
+        columns: lists of the columns to read keyed by file name
+
+    Returns:
+        partridge Feed
+    """
+    config = ptg.config.default_config()
+
+    columns = {
+        filename: set(file_columns) for filename, file_columns in columns.items()
+    }
+    for filename, column_filters in view.items():
+        if filename in columns:
+            columns[filename].update(column_filters)
+    for _, _, data in config.edges(data=True):
+        for dependency in data["dependencies"]:
+            for filename, column in dependency.items():
+                if filename in columns:
+                    columns[filename].add(column)
+
+    # filter the feed one view at a time, as partridge.load_feed() does
+    filter_config = ptg.utilities.remove_node_attributes(
+        config, ["converters", "transformations"]
+    )
+    feed = _GtfsFeed(gtfs_feed_dir, config=filter_config, columns=columns)
+    for filename, column_filters in view.items():
+        filter_config = ptg.config.reroot_graph(filter_config, filename)
+        feed = ptg.gtfs.Feed(
+            feed, view={filename: column_filters}, config=filter_config
+        )
+
+    return ptg.gtfs.Feed(feed, config=config)
+
+
+@functools.lru_cache(maxsize=None)
+def _time_period_breakpoints(time_period_to_time: tuple):
+    """
+    Sorts the time period start times into breakpoints for
+    StandardTransit.time_to_cube_time_periods().
+
+    Args:
+        time_period_to_time: tuple of (time period name, (start "HH:MM",
+            end "HH:MM")) pairs, in the order of
+            Parameters.time_period_to_time
+
+    Returns:
+        A tuple of the sorted time period start times in seconds from
+        midnight and an array of the time period names, starting with the
+        time period that spans midnight ("NA" if there isn't one) followed
+        by the time period of each start time.
+    """
+
+    def _secs(hhmmss: str) -> int:
+        return sum(int(i) * secs for i, secs in zip(hhmmss.split(":"), (3600, 60, 1)))
+
+    tp_names = [tp_name for tp_name, _times in time_period_to_time]
+    tp_starts = np.array([_secs(_times[0]) for _, _times in time_period_to_time])
+    tp_ends = np.array([_secs(_times[1]) for _, _times in time_period_to_time])
+
+    # the first time period that ends before it starts spans midnight
+    spans_midnight = np.flatnonzero(tp_starts > tp_ends)
+    midnight_tp = tp_names[spans_midnight[0]] if len(spans_midnight) else "NA"
+
+    # stable, so later time periods with the same start time win
+    order = np.argsort(tp_starts, kind="stable")
+
+    return (
+        tp_starts[order],
+        np.array([midnight_tp] + [tp_names[i] for i in order], dtype=object),
+    )
@@ -1,3 +1,6 @@
+import os
+
+
 def get_shared_streets_intersection_hash(lat, long, osm_node_id=None):
     """
     Calculated per:
@@ -47,3 +50,102 @@ def secs_to_datetime(secs: int):
     dt = (datetime.datetime.min + datetime.timedelta(seconds=secs)).time()
 
     return dt
+
+
+# libraries whose versions are part of cache keys, because cached objects are
+# pickled with them or were made with them
+CACHE_KEY_LIBRARIES = ["numpy", "pandas", "geopandas", "shapely", "lark"]
+
+
+def cache_key_hash(version: int):
+    """
+    Starts the hash of a cache key with a cache version and the versions of
+    python and of the CACHE_KEY_LIBRARIES, so that cache entries written with
+    other versions aren't read.
+
+    Args:
+        version: version of the cached data, incremented when it changes
+    Returns:
+        h: hashlib sha256 object to add the rest of the key to
+    """
+    import hashlib
+    import importlib
+    import platform
+
+    h = hashlib.sha256()
+    h.update(
+        "version={};python={};".format(version, platform.python_version()).encode()
+    )
+    for name in CACHE_KEY_LIBRARIES:
+        try:
+            library_version = importlib.import_module(name).__version__
+        except (ImportError, AttributeError):
+            library_version = ""
+        h.update("{}={};".format(name, library_version).encode())
+
+    return h
+
+
+def update_hash_with_file(h, filename: str):
+    """
+    Adds the contents of a file to a hash, so that the hash doesn't depend
+    on where the file is.
+
+    Args:
+        h: hashlib hash object
+        filename: file path
+    """
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+
+
+def read_cache_pickle(cache_path: str):
+    """
+    Reads an object from a cache file written by write_cache_pickle().
+
+    Args:
+        cache_path: file path of the cache entry
+    Returns:
+        obj: the cached object, or None if there isn't a cache entry
+    """
+    import pickle
+
+    if not os.path.isfile(cache_path):
+        return None
+
+    with open(cache_path, "rb") as f:
+        return pickle.load(f)
+
+
+def write_cache_pickle(obj, cache_path: str) -> bool:
+    """
+    Pickles an object to a cache file.
+
+    The object is written to a temporary file which is then renamed, so that
+    a partly written cache entry is never read.
+
+    Args:
+        obj: object to cache
+        cache_path: file path of the cache entry
+    Returns:
+        written: True if the cache entry was written
+    """
+    import pickle
+    import tempfile
+
+    cache_dir = os.path.dirname(cache_path)
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+
+    fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
+
+    return True
@@ -0,0 +1,104 @@
+import glob
+import os
+import sys
+import tempfile
+import time
+
+from lark import Lark
+
+from lasso import CubeTransit
+from lasso.transit import TRANSIT_LINE_FILE_GRAMMAR, _scan_transit_lines
+
+USAGE = """
+  Compares parse time per cube line file when the parser is built for
+  every file with parse time when the compiled parser is reused, and with
+  the time to read the file with the scanner for common line files.
+
+  python benchmark_lin_parse.py [lin file or folder ...]
+  """
+
+EXAMPLE_DIR = os.path.join(os.path.dirname(__file__), "..", "examples", "cube")
+
+
+def _lin_files(sources):
+    lin_files = []
+    for source in sources:
+        if os.path.isdir(source):
+            lin_files += sorted(
+                glob.glob(os.path.join(source, "**", "*.LIN"), recursive=True)
+            )
+        else:
+            lin_files.append(source)
+    return lin_files
+
+
+def _time(f, *args, **kwargs):
+    start = time.perf_counter()
+    result = f(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+if __name__ == "__main__":
+
+    lin_files = _lin_files(sys.argv[1:] or [EXAMPLE_DIR])
+
+    if not lin_files:
+        raise ValueError("No cube line files found" + USAGE)
+
+    build_s, _ = _time(Lark, TRANSIT_LINE_FILE_GRAMMAR, debug="debug", parser="lalr")
+    print("Building the parser: {:.3f}s".format(build_s))
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache_file = os.path.join(temp_dir, "lin_parser.cache")
+        Lark(TRANSIT_LINE_FILE_GRAMMAR, debug="debug", parser="lalr", cache=cache_file)
+        load_s, _ = _time(
+            Lark,
+            TRANSIT_LINE_FILE_GRAMMAR,
+            debug="debug",
+            parser="lalr",
+            cache=cache_file,
+        )
+    print("Loading the parser from a cache file: {:.3f}s".format(load_s))
+
+    print(
+        "\n{:<60} {:>12} {:>12} {:>12}".format(
+            "file", "rebuilt (s)", "reused (s)", "scanned (s)"
+        )
+    )
+
+    # build the reused parser before timing, so that only parsing is timed
+    CubeTransit.get_parser()
+
+    total_rebuilt_s = 0
+    total_reused_s = 0
+    total_scanned_s = 0
+    for lin_file in lin_files:
+        with open(lin_file) as f:
+            lin = f.read()
+
+        # parser built for every file, as add_cube used to do
+        rebuilt_s, _ = _time(
+            lambda: Lark(
+                TRANSIT_LINE_FILE_GRAMMAR, debug="debug", parser="lalr"
+            ).parse(lin)
+        )
+        reused_s, _ = _time(lambda: CubeTransit.get_parser().parse(lin))
+        scanned_s, scanned_lines = _time(_scan_transit_lines, lin)
+
+        total_rebuilt_s += rebuilt_s
+        total_reused_s += reused_s
+        total_scanned_s += scanned_s
+        print(
+            "{:<60} {:>12.3f} {:>12.3f} {:>12}".format(
+                os.path.relpath(lin_file)[-60:],
+                rebuilt_s,
+                reused_s,
+                "{:.3f}".format(scanned_s) if scanned_lines else "unsupported",
+            )
+        )
+
+    print(
+        "{:<60} {:>12.3f} {:>12.3f} {:>12.3f}".format(
+            "total", total_rebuilt_s, total_reused_s, total_scanned_s
+        )
+    )
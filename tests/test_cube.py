@@ -1,8 +1,10 @@
 import os
 import glob
 import re
+import shutil
 
 import pytest
+import pandas as pd
 
 from lasso import Project
 from lasso import CubeTransit
@@ -96,6 +98,296 @@ def test_read_transit_linefile(request):
     ## todo write an assert that actually tests something
 
 
+@pytest.mark.transit
+@pytest.mark.travis
+def test_transit_linefile_parser_reuse(request):
+    print("\n--Starting:", request.node.name)
+
+    assert CubeTransit.get_parser() is CubeTransit.get_parser()
+
+    parser_cache = os.path.join(SCRATCH_DIR, "lin_parser.cache")
+    if os.path.exists(parser_cache):
+        os.remove(parser_cache)
+
+    with open(os.path.join(CUBE_DIR, "transit.LIN")) as f:
+        lin = f.read()
+
+    parse_tree = CubeTransit.get_parser().parse(lin)
+    cached_parse_tree = CubeTransit.get_parser(cache=parser_cache).parse(lin)
+
+    assert os.path.exists(parser_cache)
+    assert parse_tree == cached_parse_tree
+
+
+@pytest.mark.travis
+@pytest.mark.transit
+def test_transit_linefile_inline_transform(request):
+    print("\n--Starting:", request.node.name)
+
+    from lasso.transit import CubeTransformer
+
+    with open(os.path.join(CUBE_DIR, "transit.LIN")) as f:
+        lin = f.read()
+
+    tree_data = CubeTransformer().transform(CubeTransit.get_parser().parse(lin))
+
+    # parse twice so the transformer shared by the parser is reused
+    CubeTransit.get_parser(transform=True).parse(lin)
+    inline_parser = CubeTransit.get_parser(transform=True)
+    inline_parser.options.transformer.reset()
+    inline_data = inline_parser.parse(lin)
+
+    assert inline_data["program_type"] == tree_data["program_type"]
+    assert list(inline_data["lines"]) == list(tree_data["lines"])
+    for line_name, line in tree_data["lines"].items():
+        inline_line = inline_data["lines"][line_name]
+        assert inline_line["line_properties"] == line["line_properties"]
+        assert inline_line["line_shape"] == line["line_shape"]
+
+
+@pytest.mark.parametrize(
+    "linefilename",
+    glob.glob(os.path.join(CUBE_DIR, "**", "*.LIN"), recursive=True)
+    + [os.path.join(CUBE_DIR, "NewLine_ExpressMpls.LIN_")],
+)
+@pytest.mark.travis
+@pytest.mark.transit
+def test_transit_linefile_scan(request, linefilename):
+    print("\n--Starting:", request.node.name)
+
+    from lasso.transit import _scan_transit_lines
+
+    with open(linefilename) as f:
+        lin = f.read()
+
+    parser = CubeTransit.get_parser(transform=True)
+    parser.options.transformer.reset()
+    parsed_data = parser.parse(lin)
+
+    program_type, line_properties_dict, line_nodes_dict = _scan_transit_lines(lin)
+
+    assert program_type == parsed_data["program_type"]
+    assert list(line_properties_dict) == list(parsed_data["lines"])
+    for line_name, line in parsed_data["lines"].items():
+        assert line_properties_dict[line_name] == line["line_properties"]
+        assert line_nodes_dict[line_name] == line["line_shape"]
+
+
+@pytest.mark.travis
+@pytest.mark.transit
+def test_transit_linefile_scan_fallback(request):
+    print("\n--Starting:", request.node.name)
+
+    from lasso.transit import _scan_transit_lines
+
+    lin_with_node_attributes = """;;<<PT>><<LINE>>;;
+LINE NAME="0_452-111_452_pk1", HEADWAY[1]=60, MODE=7,
+ N=81615, -81582, ACCESS=1, 24534
+"""
+    assert _scan_transit_lines(lin_with_node_attributes) is None
+
+    tn = CubeTransit.create_from_cube(lin_with_node_attributes)
+    assert tn.shapes['"0_452-111_452_pk1"'].node.tolist() == [81615, -81582, 24534]
+
+
+@pytest.mark.travis
+@pytest.mark.transit
+def test_evaluate_differences_parallel(request):
+    print("\n--Starting:", request.node.name)
+
+    base_linefile = os.path.join(CUBE_DIR, "transit.LIN")
+    build_linefile = os.path.join(
+        CUBE_DIR, "single_transit_route_attribute_change", "transit.LIN"
+    )
+
+    transit_changes = CubeTransit.create_from_cube(build_linefile).evaluate_differences(
+        CubeTransit.create_from_cube(base_linefile)
+    )
+    parallel_transit_changes = CubeTransit.create_from_cube(
+        build_linefile
+    ).evaluate_differences(CubeTransit.create_from_cube(base_linefile), n_workers=2)
+
+    assert transit_changes
+    assert transit_changes == parallel_transit_changes
+
+
+@pytest.mark.travis
+@pytest.mark.transit
+def test_line_fingerprints(request, monkeypatch):
+    print("\n--Starting:", request.node.name)
+
+    base_linefile = os.path.join(CUBE_DIR, "transit.LIN")
+    build_linefile = os.path.join(CUBE_DIR, "transit_route_shape_change", "transit.LIN")
+
+    base_tn = CubeTransit.create_from_cube(base_linefile)
+    build_tn = CubeTransit.create_from_cube(build_linefile)
+
+    changed_lines = [
+        line
+        for line in build_tn.lines
+        if line in base_tn.lines
+        and (
+            build_tn.line_properties[line] != base_tn.line_properties[line]
+            or not build_tn.shapes[line].equals(base_tn.shapes[line])
+        )
+    ]
+    assert changed_lines
+    for line in build_tn.lines:
+        if line in base_tn.lines:
+            assert (line in changed_lines) == (
+                build_tn.line_fingerprint(line) != base_tn.line_fingerprint(line)
+            )
+
+    evaluated_lines = []
+    evaluate_line_differences = CubeTransit.evaluate_line_differences
+
+    def _count_evaluate_line_differences(self, base_transit, line, tp):
+        evaluated_lines.append(line)
+        return evaluate_line_differences(self, base_transit, line, tp)
+
+    monkeypatch.setattr(
+        CubeTransit, "evaluate_line_differences", _count_evaluate_line_differences
+    )
+    build_tn.evaluate_differences(base_tn)
+
+    assert evaluated_lines == changed_lines
+
+    line = base_tn.lines[0]
+    fingerprint = base_tn.line_fingerprint(line)
+    base_tn.shapes[line] = base_tn.shapes[line].iloc[1:]
+    assert base_tn.line_fingerprint(line) != fingerprint
+
+
+@pytest.mark.travis
+@pytest.mark.transit
+def test_evaluate_route_property_differences(request):
+    print("\n--Starting:", request.node.name)
+
+    tn = CubeTransit()
+    property_changes = tn.evaluate_route_property_differences(
+        {"NAME": '"0_452-111_452_pk1"', "HEADWAY[1]": 20, "MODE": 7, "ONEWAY": "T"},
+        {"NAME": '"0_452-111_452_pk1"', "HEADWAY[1]": 60, "HEADWAY[2]": 30, "MODE": 7},
+        "1",
+    )
+
+    assert property_changes == [
+        {"property": "headway_secs", "set": 1200},
+        {"property": "ONEWAY", "set": "T"},
+    ]
+
+
+@pytest.mark.travis
+@pytest.mark.transit
+def test_evaluate_route_shape_changes(request):
+    print("\n--Starting:", request.node.name)
+
+    from pandas import DataFrame
+
+    base_shape = DataFrame({"node": [1, -2, 3, 4, -5, 6, 7, 8, 9, 10, -11, 12]})
+    build_shape = DataFrame({"node": [1, -2, 3, 40, -5, 6, 7, 8, 9, 10, 13, -11, 12]})
+
+    tn = CubeTransit()
+    shape_changes = tn.evaluate_route_shape_changes(build_shape, base_shape)
+
+    assert shape_changes == [
+        {"property": "routing", "existing": [-2, 3, 4, -5], "set": [-2, 3, 40, -5]},
+        {"property": "routing", "existing": [9, 10, -11], "set": [9, 10, 13, -11]},
+    ]
+    assert tn.evaluate_route_shape_changes(base_shape, base_shape) is None
+    assert (
+        tn.evaluate_route_shape_changes(
+            build_shape.node.values, base_shape.node.values
+        )
+        == shape_changes
+    )
+
+
+@pytest.mark.travis
+@pytest.mark.transit
+def test_add_additional_time_periods(request):
+    print("\n--Starting:", request.node.name)
+
+    tn = CubeTransit.create_from_cube(
+        """;;<<PT>><<LINE>>;;
+LINE NAME="0_452-111_452_pk1",
+ LONGNAME="Express -Mendota Heights - West St Paul - Mpls",
+ HEADWAY[1]=60,
+ HEADWAY[2]=30,
+ MODE=7,
+ ONEWAY=T,
+ OPERATOR=3,
+NODES=
+ 81615,
+ -81582,
+ 24534
+"""
+    )
+    line = '"0_452-111_452_pk1"'
+    new_line = tn.add_additional_time_periods("2", line)
+
+    assert new_line == "0_452-111_452_MD1"
+    assert dict(tn.line_properties[line]) == {
+        "NAME": line,
+        "LONGNAME": '"Express -Mendota Heights - West St Paul - Mpls"',
+        "HEADWAY[1]": 60,
+        "MODE": 7,
+        "ONEWAY": "T",
+        "OPERATOR": 3,
+    }
+    assert list(tn.line_properties[new_line].items()) == [
+        ("NAME", new_line),
+        ("LONGNAME", '"Express -Mendota Heights - West St Paul - Mpls"'),
+        ("HEADWAY[2]", 30),
+        ("MODE", 7),
+        ("ONEWAY", "T"),
+        ("OPERATOR", 3),
+    ]
+    assert tn.shapes[new_line].equals(tn.shapes[line])
+
+    # the lines share their properties and node numbers
+    assert tn.line_properties[new_line]._base is tn.line_properties[line]._base
+    assert tn.shapes.nodes(new_line).base is tn.shapes.nodes(line).base
+
+
+@pytest.mark.travis
+@pytest.mark.transit
+def test_cube_shapes(request):
+    print("\n--Starting:", request.node.name)
+
+    import copy
+    from lasso.transit import CubeShapes
+
+    shapes = CubeShapes.from_node_lists({"a": [1, -2, 3], "b": [3, 4]})
+
+    assert list(shapes) == ["a", "b"]
+    assert shapes["a"].node.tolist() == [1, -2, 3]
+    assert shapes["a"].node_id.tolist() == [1, 2, 3]
+    assert shapes["a"].stop.tolist() == [True, False, True]
+    assert shapes["b"].order.tolist() == [1, 2]
+    with pytest.raises(ValueError):
+        shapes.nodes("a")[0] = 5
+
+    shape = shapes["a"]
+    shape.loc[0, "node"] = 5
+    assert shapes["a"].node.tolist() == [1, -2, 3]
+    shapes["a"] = shape
+    assert shapes["a"].node.tolist() == [5, -2, 3]
+    shapes["a"] = [1, -2, 3]
+
+    shapes_copy = copy.deepcopy(shapes)
+    shapes_copy["c"] = shapes_copy.nodes("a")
+    shapes_copy["b"] = shapes["b"].iloc[:1]
+    assert shapes_copy["c"].equals(shapes["a"])
+    assert shapes_copy["b"].node.tolist() == [3]
+    assert list(shapes) == ["a", "b"]
+    assert shapes["b"].node.tolist() == [3, 4]
+
+    del shapes_copy["c"]
+    assert shapes_copy != shapes
+    shapes_copy["b"] = [3, 4]
+    assert shapes_copy == shapes
+
+
 @pytest.mark.travis
 @pytest.mark.transit
 @pytest.mark.basic
@@ -109,6 +401,107 @@ def test_create_cube_transit_network_from_dir(request):
     ## todo write an assert that actually tests something
 
 
+@pytest.mark.travis
+@pytest.mark.transit
+def test_create_cube_transit_network_from_dir_parallel(request):
+    print("\n--Starting:", request.node.name)
+
+    # split the example line file into several line files
+    with open(os.path.join(CUBE_DIR, "transit.LIN")) as f:
+        program_type_line, lin = f.read().split("\n", 1)
+    lin_list = re.split(r"(?=^LINE NAME)", lin, flags=re.M)
+
+    lin_dir = os.path.join(SCRATCH_DIR, "split_transit")
+    if not os.path.exists(lin_dir):
+        os.makedirs(lin_dir)
+    for i in range(4):
+        with open(os.path.join(lin_dir, "transit_{}.LIN".format(i)), "w") as f:
+            f.write(program_type_line + "\n" + "".join(lin_list[i::4]))
+
+    tn = CubeTransit.create_from_cube(lin_dir)
+    parallel_tn = CubeTransit.create_from_cube(lin_dir, n_workers=2)
+
+    assert tn.lines == parallel_tn.lines
+    assert tn.source_list == parallel_tn.source_list
+    assert tn.line_properties == parallel_tn.line_properties
+    for line in tn.lines:
+        assert tn.shapes[line].equals(parallel_tn.shapes[line])
+
+
+@pytest.mark.travis
+@pytest.mark.transit
+def test_create_cube_transit_network_from_dir_cache(request, monkeypatch):
+    print("\n--Starting:", request.node.name)
+
+    import lasso.transit
+
+    # split the example line file into two line files
+    with open(os.path.join(CUBE_DIR, "transit.LIN")) as f:
+        program_type_line, lin = f.read().split("\n", 1)
+    lin_list = re.split(r"(?=^LINE NAME)", lin, flags=re.M)
+
+    lin_dir = os.path.join(SCRATCH_DIR, "cached_transit")
+    cache_dir = os.path.join(SCRATCH_DIR, "transit_cache")
+    for d in [lin_dir, cache_dir]:
+        if os.path.exists(d):
+            shutil.rmtree(d)
+    os.makedirs(lin_dir)
+    for i in range(2):
+        with open(os.path.join(lin_dir, "transit_{}.LIN".format(i)), "w") as f:
+            f.write(program_type_line + "\n" + "".join(lin_list[i::2]))
+
+    tn = CubeTransit.create_from_cube(lin_dir, cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 2
+
+    # change one of the files and count the files that are parsed again
+    with open(os.path.join(lin_dir, "transit_1.LIN"), "w") as f:
+        f.write(program_type_line + "\n" + "".join(lin_list[1::2][:-1]))
+
+    parsed_files = []
+    read_transit_line_file = lasso.transit._read_transit_line_file
+
+    def _count_read_transit_line_file(job):
+        parsed_files.append(job[0])
+        return read_transit_line_file(job)
+
+    monkeypatch.setattr(
+        lasso.transit, "_read_transit_line_file", _count_read_transit_line_file
+    )
+
+    cached_tn = CubeTransit.create_from_cube(
+        lin_dir, parameters={"transit_cache_dir": cache_dir}
+    )
+
+    assert parsed_files == [os.path.join(lin_dir, "transit_1.LIN")]
+    assert len(os.listdir(cache_dir)) == 3
+    assert cached_tn.lines == tn.lines[:-1]
+    assert cached_tn.source_list == tn.source_list
+    for line in cached_tn.lines:
+        assert cached_tn.line_properties[line] == tn.line_properties[line]
+        assert cached_tn.shapes[line].equals(tn.shapes[line])
+
+
+@pytest.mark.travis
+@pytest.mark.transit
+def test_transit_line_file_cache_key_versions(request, monkeypatch):
+    print("\n--Starting:", request.node.name)
+
+    import lark
+    import lasso.transit
+
+    lin_file = os.path.join(CUBE_DIR, "transit.LIN")
+    key = lasso.transit._transit_line_file_cache_key(lin_file)
+    assert lasso.transit._transit_line_file_cache_key(lin_file) == key
+
+    # cache entries written with other library versions aren't read
+    monkeypatch.setattr(lark, "__version__", "0.0.0")
+    assert lasso.transit._transit_line_file_cache_key(lin_file) != key
+    monkeypatch.undo()
+
+    monkeypatch.setattr(pd, "__version__", "0.0.0")
+    assert lasso.transit._transit_line_file_cache_key(lin_file) != key
+
+
 @pytest.mark.parametrize("logfilename", logfile_list)
 @pytest.mark.travis
 @pytest.mark.roadway
@@ -328,3 +721,169 @@ def test_write_cube_transit_standard(request):
     cube_transit_net = StandardTransit.read_gtfs(BASE_TRANSIT_DIR)
 
     cube_transit_net.write_as_cube_lin(os.path.join(SCRATCH_DIR, "t_transit_test.lin"))
+
+
+@pytest.mark.travis
+@pytest.mark.transit
+def test_shape_gtfs_to_cube(request):
+    """
+    Tests that the node list of each trip follows its shape and that only
+    the nodes its stops are at are written as stops.
+    """
+    print("\n--Starting:", request.node.name)
+
+    cube_transit_net = StandardTransit.read_gtfs(BASE_TRANSIT_DIR)
+    feed = cube_transit_net.feed
+
+    for row in feed.trips.itertuples():
+        node_list_str = cube_transit_net.shape_gtfs_to_cube(row)
+
+        shape_nodes = feed.shapes[feed.shapes.shape_id == row.shape_id][
+            "shape_model_node_id"
+        ].tolist()
+        stop_ids = feed.stop_times[feed.stop_times.trip_id == row.trip_id].stop_id
+        stop_nodes = feed.stops[feed.stops.stop_id.isin(stop_ids)][
+            "model_node_id"
+        ].tolist()
+
+        nodes = [n.strip() for n in node_list_str.split(",")]
+        assert nodes == [
+            str(n) if n in stop_nodes else "-{}".format(n) for n in shape_nodes
+        ]
+
+
+@pytest.mark.travis
+@pytest.mark.transit
+def test_time_to_cube_time_periods(request):
+    """
+    Tests that start times are classified into the time periods, including
+    the time period that spans midnight and times past 24:00:00.
+    """
+    print("\n--Starting:", request.node.name)
+
+    cube_transit_net = StandardTransit.read_gtfs(BASE_TRANSIT_DIR)
+
+    start_times = [0, 6 * 3600 - 1, 6 * 3600, 12 * 3600, 18 * 3600, 22 * 3600]
+    time_periods = ["NT", "NT", "AM", "MD", "PM", "NT"]
+
+    next_day_start_times = [t + 24 * 3600 for t in start_times]
+
+    tps = cube_transit_net.time_to_cube_time_periods(start_times)
+    assert tps.tolist() == time_periods
+    tps = cube_transit_net.time_to_cube_time_periods(next_day_start_times)
+    assert tps.tolist() == time_periods
+    tps = [cube_transit_net.time_to_cube_time_period(t) for t in start_times]
+    assert tps == time_periods
+
+    assert cube_transit_net.time_to_cube_time_periods(
+        [7 * 3600, 12 * 3600], as_str=False
+    ).tolist() == ["1", "2"]
+    with pytest.raises(ValueError):
+        cube_transit_net.time_to_cube_time_period(18 * 3600, as_str=False)
+
+
+@pytest.mark.travis
+@pytest.mark.transit
+def test_calculate_cube_modes(request):
+    """
+    Tests that the cube modes of all trips are the same as the cube mode
+    of each trip.
+    """
+    print("\n--Starting:", request.node.name)
+
+    cube_transit_net = StandardTransit.read_gtfs(BASE_TRANSIT_DIR)
+    trip_df = cube_transit_net.route_properties_gtfs_to_cube(cube_transit_net)
+
+    cube_modes = trip_df.apply(cube_transit_net.calculate_cube_mode, axis=1)
+
+    assert trip_df["MODE"].tolist() == cube_modes.tolist()
+    assert set(cube_modes) == {5, 6, 7, 8}
+
+
+@pytest.mark.travis
+@pytest.mark.transit
+def test_write_cube_transit_standard_chunks(request):
+    """
+    Tests that the cube line file is the same as the lines formatted trip by
+    trip, and when it's written in small chunks and gzip compressed.
+    """
+    print("\n--Starting:", request.node.name)
+
+    import gzip
+
+    cube_transit_net = StandardTransit.read_gtfs(BASE_TRANSIT_DIR)
+
+    outpath = os.path.join(SCRATCH_DIR, "t_transit_test.lin")
+    chunked_outpath = os.path.join(SCRATCH_DIR, "t_transit_test_chunked.lin")
+    gzip_outpath = os.path.join(SCRATCH_DIR, "t_transit_test.lin.gz")
+
+    cube_transit_net.write_as_cube_lin(outpath)
+    cube_transit_net.write_as_cube_lin(chunked_outpath, chunk_size=100)
+    cube_transit_net.write_as_cube_lin(gzip_outpath)
+
+    with open(outpath) as f:
+        lin = f.read()
+    assert lin.count("LINE NAME=") == len(cube_transit_net.feed.trips)
+    trip_cube_df = cube_transit_net.route_properties_gtfs_to_cube(cube_transit_net)
+    assert lin == "\n".join(
+        cube_transit_net.cube_format(row) for row in trip_cube_df.itertuples()
+    )
+    with open(chunked_outpath) as f:
+        assert f.read() == lin
+    with gzip.open(gzip_outpath, "rt") as f:
+        assert f.read() == lin
+
+
+@pytest.mark.travis
+@pytest.mark.transit
+def test_read_cube_transit_standard_view(request):
+    """
+    Tests that a GTFS feed can be read for some agencies and for a service
+    date, with only the columns used to write cube line files.
+    """
+    print("\n--Starting:", request.node.name)
+
+    import datetime
+
+    cube_transit_net = StandardTransit.read_gtfs(
+        BASE_TRANSIT_DIR, view={"routes.txt": {"agency_id": "2"}}
+    )
+    all_columns_transit_net = StandardTransit.read_gtfs(
+        BASE_TRANSIT_DIR, view={"routes.txt": {"agency_id": "2"}}, all_columns=True
+    )
+
+    assert set(cube_transit_net.feed.routes.agency_id) == {"2"}
+    assert set(cube_transit_net.feed.stops.columns) < set(
+        all_columns_transit_net.feed.stops.columns
+    )
+    for table in ["trips", "shapes", "stops", "stop_times"]:
+        df = getattr(cube_transit_net.feed, table)
+        all_columns_df = getattr(all_columns_transit_net.feed, table)
+        pd.testing.assert_frame_equal(df, all_columns_df[df.columns])
+
+    gtfs_dir = os.path.join(SCRATCH_DIR, "t_gtfs_calendar")
+    if os.path.exists(gtfs_dir):
+        shutil.rmtree(gtfs_dir)
+    shutil.copytree(BASE_TRANSIT_DIR, gtfs_dir)
+    pd.DataFrame(
+        {
+            "service_id": ["JUN19-MVS-BUS-Weekday-01", "JUN19-RAIL-Weekday-01"],
+            "monday": [1, 1],
+            "tuesday": [1, 1],
+            "wednesday": [1, 1],
+            "thursday": [1, 1],
+            "friday": [1, 1],
+            "saturday": [0, 1],
+            "sunday": [0, 1],
+            "start_date": ["20190601", "20190601"],
+            "end_date": ["20190831", "20190831"],
+        }
+    ).to_csv(os.path.join(gtfs_dir, "calendar.txt"), index=False)
+
+    saturday_transit_net = StandardTransit.read_gtfs(
+        gtfs_dir, service_date=datetime.date(2019, 6, 8)
+    )
+    assert set(saturday_transit_net.feed.trips.service_id) == {"JUN19-RAIL-Weekday-01"}
+
+    with pytest.raises(ValueError):
+        StandardTransit.read_gtfs(gtfs_dir, service_date=datetime.date(2020, 6, 8))
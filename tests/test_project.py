@@ -1,12 +1,18 @@
 import os
 import glob
 import re
+import shutil
 from typing import Any, Dict, Optional
 
 import pytest
+import numpy as np
+import pandas as pd
+import yaml
+from geopandas import GeoDataFrame
 from pandas import DataFrame
+from shapely.geometry import LineString, Point
 
-from lasso import Project
+from lasso import ModelRoadwayNetwork, Project
 
 """
 Run tests from bash/shell
@@ -35,6 +41,82 @@ def test_logfile_read(request, logfilename):
     assert type(lf) == DataFrame
 
 
+@pytest.mark.parametrize("logfilename", logfile_list)
+@pytest.mark.travis
+def test_logfile_read_chunks(request, logfilename):
+    """
+    Tests that reading the logfile in small chunks gives
+    the same records as reading it in one go.
+    """
+    print("\n--Starting:", request.node.name)
+
+    print("Reading: {}".format(logfilename))
+    lf = Project.read_logfile(logfilename)
+
+    chunks = list(Project.read_logfile_chunks(logfilename, chunksize=2))
+    assert len(chunks) > 1
+
+    node_df = pd.concat([n for n, l in chunks], ignore_index=True, sort=False)
+    link_df = pd.concat([l for n, l in chunks], ignore_index=True, sort=False)
+    chunked_lf = pd.concat([link_df, node_df], ignore_index=True, sort=False)
+
+    pd.testing.assert_frame_equal(lf, chunked_lf)
+
+
+@pytest.mark.travis
+def test_logfile_read_types(request):
+    """
+    Tests that logfile columns are typed from the log header and
+    the variable crosswalks.
+    """
+    print("\n--Starting:", request.node.name)
+
+    logfilename = os.path.join(CUBE_DIR, "i394_parallel_managed_lanes.log")
+    node_df, link_df = next(Project.read_logfile_chunks(logfilename))
+
+    assert "NAME[111]" in link_df.columns
+    assert "SHSTGEOMETRYID[32]" in link_df.columns
+    assert "NAME" not in link_df.columns
+    assert link_df["NAME[111]"].dtype == object
+    assert not link_df["NAME[111]"].str.startswith('"').any()
+    assert link_df["A"].dtype == "int64"
+    assert link_df["B"].dtype == "int64"
+    assert link_df["GROUP"].dtype == "int64"
+    assert link_df["LANES_AM"].dtype == "int64"
+    assert link_df["DISTANCE"].dtype == "float64"
+
+
+@pytest.mark.travis
+def test_logfile_read_int_fallback(request):
+    """
+    Tests that only the integer log columns with missing values are read as floats.
+    """
+    print("\n--Starting:", request.node.name)
+
+    schema = {
+        "names": ["OBJECT", "OPERATION", "GROUP", "A", "B", "LANES", "NAME[20]"],
+        "dtype": {
+            "OBJECT": str,
+            "OPERATION": str,
+            "GROUP": np.int64,
+            "A": np.int64,
+            "B": np.int64,
+            "LANES": np.int64,
+            "NAME[20]": str,
+        },
+    }
+    lines = ['L,C,0,1,2,3,"Main St"\n', 'L,C,0,2,3,,""\n']
+    link_df = Project._log_lines_to_df(lines, schema)
+
+    assert link_df["A"].dtype == "int64"
+    assert link_df["B"].dtype == "int64"
+    assert link_df["GROUP"].dtype == "int64"
+    assert link_df["LANES"].dtype == "float64"
+    assert link_df["LANES"].iloc[0] == 3
+    assert np.isnan(link_df["LANES"].iloc[1])
+    assert link_df["NAME[20]"].tolist() == ["Main St", ""]
+
+
 @pytest.mark.parametrize("logfilename", logfile_list)
 @pytest.mark.travis
 def test_highway_project_card(request, logfilename):
@@ -64,6 +146,399 @@ def test_highway_project_card(request, logfilename):
     )
 
 
+@pytest.mark.parametrize("logfilename", logfile_list)
+@pytest.mark.travis
+def test_highway_project_card_stream(request, logfilename):
+    """
+    Tests that streamed and compact project cards have the same
+    content as the project card written all at once.
+    """
+    print("\n--Starting:", request.node.name)
+
+    test_project = Project.create_project(
+        roadway_log_file=logfilename, base_roadway_dir=ROADWAY_DIR
+    )
+
+    card_name = "t_" + os.path.splitext(os.path.basename(logfilename))[0]
+    card_file = os.path.join(SCRATCH_DIR, card_name + ".yml")
+    stream_card_file = os.path.join(SCRATCH_DIR, card_name + "_stream.yml")
+    compact_card_file = os.path.join(SCRATCH_DIR, card_name + "_compact.yml")
+
+    # streamed from the evaluated changes, before card_data is made
+    test_project.write_project_card(stream_card_file, stream=True)
+    test_project.write_project_card(compact_card_file, compact=True)
+    test_project.write_project_card(card_file)
+
+    with open(card_file) as f:
+        card = yaml.load(f, Loader=yaml.Loader)
+    with open(stream_card_file) as f:
+        assert yaml.load(f, Loader=yaml.Loader) == card
+    with open(compact_card_file) as f:
+        assert yaml.load(f, Loader=yaml.Loader) == card
+
+    # streamed from card_data
+    test_project.write_project_card(stream_card_file, stream=True)
+    with open(stream_card_file) as f:
+        assert yaml.load(f, Loader=yaml.Loader) == card
+
+
+@pytest.mark.travis
+def test_highway_project_cards_batch(request):
+    """
+    Tests that project cards can be written for several logfiles
+    compared to the same base network.
+    """
+    print("\n--Starting:", request.node.name)
+
+    card_files = Project.create_projects(
+        logfile_list * 2,
+        os.path.join(SCRATCH_DIR, "batch"),
+        base_roadway_dir=ROADWAY_DIR,
+        project_names=["batch_1", "batch_2"],
+        n_workers=2,
+    )
+
+    assert len(card_files) == 2
+    for card_file, project_name in zip(card_files, ["batch_1", "batch_2"]):
+        test_project = Project.create_project(
+            roadway_log_file=logfile_list[0],
+            base_roadway_dir=ROADWAY_DIR,
+            project_name=project_name,
+        )
+        single_card_file = os.path.join(SCRATCH_DIR, project_name + "_single.yml")
+        test_project.write_project_card(single_card_file)
+
+        with open(single_card_file) as f:
+            single_card = yaml.load(f, Loader=yaml.Loader)
+        with open(card_file) as f:
+            assert yaml.load(f, Loader=yaml.Loader) == single_card
+
+
+@pytest.mark.travis
+def test_project_cards_batch_duplicate_names(request):
+    """
+    Tests that change files with the same file name in different folders
+    aren't written to the same project card.
+    """
+    print("\n--Starting:", request.node.name)
+
+    batch_dir = os.path.join(SCRATCH_DIR, "batch_duplicates")
+    changes_files = [
+        os.path.join("a", "build.log"),
+        os.path.join("b", "build.log"),
+    ]
+
+    with pytest.raises(ValueError, match="build"):
+        Project.create_projects(changes_files, batch_dir, base_roadway_dir=ROADWAY_DIR)
+    with pytest.raises(ValueError, match="build_a"):
+        Project.create_projects(
+            changes_files,
+            batch_dir,
+            base_roadway_dir=ROADWAY_DIR,
+            project_names=["build_a", "build_a"],
+        )
+    assert not os.path.exists(batch_dir)
+
+
+@pytest.mark.travis
+def test_base_roadway_network_cache(request):
+    """
+    Tests that a prepared base roadway network read from the cache
+    is the same as the one that was prepared.
+    """
+    print("\n--Starting:", request.node.name)
+
+    cache_dir = os.path.join(SCRATCH_DIR, "roadway_cache")
+    if os.path.exists(cache_dir):
+        shutil.rmtree(cache_dir)
+
+    prepared_net = Project.read_base_roadway_network(
+        ROADWAY_DIR, cache_dir=cache_dir
+    )
+    assert len(os.listdir(cache_dir)) == 1
+
+    cached_net = Project.read_base_roadway_network(ROADWAY_DIR, cache_dir=cache_dir)
+
+    pd.testing.assert_frame_equal(prepared_net.links_df, cached_net.links_df)
+    pd.testing.assert_frame_equal(prepared_net.nodes_df, cached_net.nodes_df)
+    pd.testing.assert_frame_equal(prepared_net.shapes_df, cached_net.shapes_df)
+
+
+@pytest.mark.travis
+def test_change_signature(request):
+    """
+    Tests that property changes can be grouped on their signature and
+    rebuilt from it.
+    """
+    print("\n--Starting:", request.node.name)
+
+    properties = [
+        {"property": "name", "existing": "Ayd Mill Rd", "set": "Ayd's \"Mill\" Rd"},
+        {
+            "property": "lanes",
+            "existing": np.int64(2),
+            "timeofday": [{"time": ("6:00", "9:00"), "set": np.int64(3)}],
+        },
+    ]
+    same_properties = [
+        {"property": "name", "existing": "Ayd Mill Rd", "set": "Ayd's \"Mill\" Rd"},
+        {
+            "property": "lanes",
+            "existing": 2,
+            "timeofday": [{"time": ["6:00", "9:00"], "set": 3}],
+        },
+    ]
+
+    signature = Project._change_signature(properties)
+    assert hash(signature) == hash(Project._change_signature(same_properties))
+    assert signature == Project._change_signature(same_properties)
+    assert Project._change_from_signature(signature) == same_properties
+
+
+@pytest.mark.travis
+def test_consolidate_log_operations(request):
+    """
+    Tests that the operations of each link in a log are consolidated
+    into the right final operation.
+    """
+    print("\n--Starting:", request.node.name)
+
+    # operation history of a link -> final operation
+    histories = [
+        (["A"], "A"),
+        (["D"], "D"),
+        (["C"], "C"),
+        (["A", "C"], "A"),
+        (["A", "D"], "N"),
+        (["D", "A"], "C"),
+        (["C", "D"], "D"),
+        (["A", "D", "A"], "C"),
+    ]
+
+    # interleave the records of the links as they would be in a log
+    records = [
+        (step, b, operation)
+        for b, (history, _) in enumerate(histories)
+        for step, operation in enumerate(history)
+    ]
+    log_df = DataFrame(
+        [
+            {"OPERATION": op, "A": 1, "B": b, "lanes": step}
+            for step, b, op in sorted(records)
+        ]
+    )
+    base_df = DataFrame({"A": [1], "B": [0], "lanes": [1]})
+
+    consolidated_df = Project._consolidate_actions(log_df, base_df, ["A", "B"])
+
+    assert list(consolidated_df.columns) == ["A", "B", "lanes", "OPERATION_final"]
+    final_ops = dict(zip(consolidated_df["B"], consolidated_df["OPERATION_final"]))
+    assert final_ops == {b: final_op for b, (_, final_op) in enumerate(histories)}
+    # the last record of each link is kept
+    last_steps = dict(zip(consolidated_df["B"], consolidated_df["lanes"]))
+    assert last_steps == {
+        b: len(history) - 1 for b, (history, _) in enumerate(histories)
+    }
+
+
+def _small_base_network(links: dict):
+    """
+    Creates a base roadway network on the nodes 1, 2 and 3 with the given
+    link columns, which have to include A, B and model_link_id.
+    """
+    points = {1: Point(0, 0), 2: Point(1, 0), 3: Point(1, 1)}
+    geometry = [
+        LineString([points[a], points[b]]) for a, b in zip(links["A"], links["B"])
+    ]
+    shape_ids = [str(i) for i in links["model_link_id"]]
+
+    return ModelRoadwayNetwork(
+        nodes=GeoDataFrame(
+            {"model_node_id": list(points)}, geometry=list(points.values())
+        ),
+        links=GeoDataFrame(dict(links, shstGeometryId=shape_ids), geometry=geometry),
+        shapes=GeoDataFrame({"id": shape_ids}, geometry=geometry),
+    )
+
+
+def _per_row_link_property_dicts(project, link_changes_df, changeable_col):
+    """
+    Compares changed links to the base network one row at a time, the way
+    add_highway_changes used to.
+    """
+    base_links_df = project.base_roadway_network.links_df
+    property_dicts = []
+    for _, change_row in link_changes_df.iterrows():
+        base_row = base_links_df[
+            (base_links_df["A"] == change_row.A) & (base_links_df["B"] == change_row.B)
+        ].iloc[0]
+
+        out_col = []
+        for col in changeable_col:
+            if (str(change_row[col]) == str(base_row[col])) | (
+                col in Project.STATIC_VALUES
+            ):
+                continue
+            if (col == "roadway_class") & (change_row[col] == 0):
+                continue
+            if col == "distance":
+                if (
+                    abs((change_row[col] - float(base_row[col])) / float(base_row[col]))
+                    > 0.01
+                ):
+                    out_col.append(col)
+            else:
+                out_col.append(col)
+
+        if out_col:
+            property_dicts.append(
+                (
+                    base_row["model_link_id"],
+                    project._link_property_dict_list(out_col, change_row, base_row),
+                )
+            )
+
+    return property_dicts
+
+
+@pytest.mark.travis
+def test_link_attribute_changes_match_per_row(request):
+    """
+    Tests that link attribute changes compared in bulk are the same as
+    when the links are compared one at a time.
+    """
+    print("\n--Starting:", request.node.name)
+
+    base_net = _small_base_network(
+        {
+            "A": [1, 2, 3, 1],
+            "B": [2, 3, 1, 3],
+            "model_link_id": [10, 11, 12, 13],
+            "name": ["a", "b", "c", np.nan],
+            "lanes_AM": [1, 2, 2, 1],
+            "lanes_MD": [1, 2, 2, 1],
+            "lanes_PM": [1, 2, 2, 1],
+            "price_sov_AM": [0.0, 0.0, 0.0, 1.0],
+            "ttime_assert_AM": [np.nan, np.nan, 5.0, 5.0],
+            "distance": [1.0, 1.0, 1.0, 1.0],
+            "roadway_class": [1, 1, 1, 1],
+            "county": ["x", "x", "x", "x"],
+        }
+    )
+    project = Project(base_roadway_network=base_net)
+
+    link_changes_df = DataFrame(
+        {
+            "A": [1, 2, 3, 1],
+            "B": [2, 3, 1, 3],
+            "model_link_id": [10, 11, 12, 13],
+            # unchanged, changed, unchanged and missing in the base network
+            "name": ["a", "B", "c", "d"],
+            # split by time period, AM and PM have the same existing value
+            "lanes_AM": [1, 3, 2, 1],
+            "lanes_MD": [1, 2, 3, 1],
+            "lanes_PM": [1, 3, 2, 1],
+            "price_sov_AM": [0.0, 0.0, 1.5, 1.0],
+            # missing in both networks, and missing in the changes only
+            "ttime_assert_AM": [np.nan, np.nan, 5.0, np.nan],
+            # changes of less than 1% aren't changes
+            "distance": [1.0, 1.005, 2.0, 1.0],
+            # a roadway class of 0 isn't a change
+            "roadway_class": [1, 0, 2, 1],
+            "county": ["x", "y", "x", "x"],
+            "OPERATION_final": ["C", "C", "C", "C"],
+        }
+    )
+    changeable_col = [c for c in link_changes_df.columns if c in base_net.links_df]
+
+    change_df = project._evaluate_link_attribute_changes(
+        link_changes_df, changeable_col
+    )
+    per_row = _per_row_link_property_dicts(project, link_changes_df, changeable_col)
+
+    assert list(change_df["model_link_id"]) == [i for i, _ in per_row]
+    assert list(change_df["model_link_id"]) == [11, 12, 13]
+    for properties, (_, per_row_properties) in zip(change_df["properties"], per_row):
+        assert Project._change_signature(properties) == Project._change_signature(
+            per_row_properties
+        )
+
+    assert Project._change_signature(change_df["properties"].iloc[0]) == (
+        Project._change_signature(
+            [
+                {"property": "name", "existing": "b", "set": "B"},
+                {
+                    "property": "lanes",
+                    "existing": 2,
+                    "timeofday": [
+                        {"time": ["6:00", "9:00"], "set": 3},
+                        {"time": ["16:00", "19:00"], "set": 3},
+                    ],
+                },
+            ]
+        )
+    )
+
+
+@pytest.mark.travis
+def test_roadway_project_card_stream_from_changes(request):
+    """
+    Tests that project cards streamed from the evaluated roadway changes,
+    without making card_data, are the same as the cards written by ProjectCard.
+    """
+    print("\n--Starting:", request.node.name)
+
+    base_net = _small_base_network(
+        {
+            "A": [1, 2, 3],
+            "B": [2, 3, 1],
+            "model_link_id": [10, 11, 12],
+            "name": ["a", "b", "c"],
+            "lanes": [1, 2, 2],
+        }
+    )
+    roadway_changes = DataFrame(
+        {
+            "OBJECT": ["L", "L", "L", "L", "N"],
+            "OPERATION": ["D", "C", "A", "A", "A"],
+            "A": [1, 2, 1, 4, 0],
+            "B": [2, 3, 4, 1, 0],
+            "model_link_id": [10, 11, 13, 14, 0],
+            "name": ["a", "B", "new", "new", ""],
+            "lanes": [1, 3, 1, 1, 0],
+            "model_node_id": [0, 0, 0, 0, 4],
+        }
+    )
+
+    card_file = os.path.join(SCRATCH_DIR, "t_stream_from_changes.yml")
+    stream_card_file = os.path.join(SCRATCH_DIR, "t_stream_from_changes_stream.yml")
+    compact_card_file = os.path.join(SCRATCH_DIR, "t_stream_from_changes_compact.yml")
+
+    test_project = Project(
+        roadway_changes=roadway_changes,
+        base_roadway_network=base_net,
+        evaluate=True,
+        project_name="stream",
+    )
+    test_project.write_project_card(stream_card_file, stream=True)
+    test_project.write_project_card(compact_card_file, compact=True)
+    assert test_project._card_data is None
+
+    test_project.write_project_card(card_file)
+
+    with open(card_file) as f:
+        card = yaml.load(f, Loader=yaml.Loader)
+    assert [change["category"] for change in card["changes"]] == [
+        "Roadway Deletion",
+        "New Roadway",
+        "Roadway Attribute Change",
+    ]
+    with open(stream_card_file) as f:
+        assert yaml.load(f, Loader=yaml.Loader) == card
+    with open(compact_card_file) as f:
+        assert yaml.load(f, Loader=yaml.Loader) == card
+
+
 @pytest.mark.parametrize("logfilename", logfile_list)
 @pytest.mark.skip("Need to update project card schema")
 def test_highway_change_project_card_valid(request, logfilename):
@@ -2,6 +2,8 @@ import re
 import os
 
 import pytest
+from geopandas import GeoDataFrame
+from shapely.geometry import LineString, Point
 
 from lasso import Parameters, ModelRoadwayNetwork
 from network_wrangler import RoadwayNetwork
@@ -165,3 +167,86 @@ def test_write_cube_roadway(request):
 
     net.write_roadway_as_fixedwidth()
     ## todo write an assert that actually tests something
+
+
+@pytest.mark.roadway
+@pytest.mark.travis
+def test_network_lookup_index(request):
+    """
+    Tests that links and nodes are found by their keys
+    """
+    print("\n--Starting:", request.node.name)
+
+    net = ModelRoadwayNetwork.read(
+        link_file=STPAUL_LINK_FILE,
+        node_file=STPAUL_NODE_FILE,
+        shape_file=STPAUL_SHAPE_FILE,
+        fast=True,
+    )
+
+    links_df = net.links_df.iloc[[0, 5, 10]]
+    link_positions = net.get_link_positions_by_AB(
+        list(links_df["A"]) + [-1], list(links_df["B"].astype(str)) + ["-1"]
+    )
+    assert list(link_positions) == [0, 5, 10, -1]
+
+    link_positions = net.get_link_positions_by_model_link_id(
+        list(links_df["model_link_id"]) + [-1]
+    )
+    assert list(link_positions) == [0, 5, 10, -1]
+
+    node_positions = net.get_node_positions_by_model_node_id(
+        list(net.nodes_df["model_node_id"].iloc[[3, 1]]) + [-1]
+    )
+    assert list(node_positions) == [3, 1, -1]
+
+    # a new links table gets a new index
+    net.links_df = net.links_df.iloc[5:]
+    assert net.get_link_positions_by_model_link_id(links_df["model_link_id"])[0] == -1
+
+
+@pytest.mark.roadway
+@pytest.mark.travis
+def test_network_lookup_index_refresh(request):
+    """
+    Tests that the link and node lookup indexes follow reassigned links
+    and nodes, and in-place edited ones once they are invalidated
+    """
+    print("\n--Starting:", request.node.name)
+
+    points = [Point(0, 0), Point(1, 0), Point(2, 0)]
+    lines = [LineString(points[:2]), LineString(points[1:])]
+    net = ModelRoadwayNetwork(
+        nodes=GeoDataFrame({"model_node_id": [1, 2, 3]}, geometry=points),
+        links=GeoDataFrame(
+            {
+                "A": [1, 2],
+                "B": [2, 3],
+                "model_link_id": [10, 11],
+                "shstGeometryId": ["a", "b"],
+            },
+            geometry=lines,
+        ),
+        shapes=GeoDataFrame({"id": ["a", "b"]}, geometry=lines),
+    )
+
+    assert list(net.get_link_positions_by_AB([2, 1], [3, 2])) == [1, 0]
+    assert list(net.get_link_positions_by_model_link_id([11, 99])) == [1, -1]
+    assert list(net.get_node_positions_by_model_node_id([3, 9])) == [2, -1]
+
+    # edits in place keep the same links and nodes tables, so the
+    # indexes are only rebuilt once they are invalidated
+    net.links_df.loc[0, "A"] = 5
+    net.links_df.loc[1, "model_link_id"] = 12
+    net.nodes_df.loc[0, "model_node_id"] = 7
+    assert list(net.get_link_positions_by_AB([1, 5], [2, 2])) == [0, -1]
+    net.invalidate_indexes()
+    assert list(net.get_link_positions_by_AB([1, 5], [2, 2])) == [-1, 0]
+    assert list(net.get_link_positions_by_model_link_id([11, 12])) == [-1, 1]
+    assert list(net.get_node_positions_by_model_node_id([1, 7])) == [-1, 0]
+
+    # reassigned tables get new indexes
+    net.links_df = net.links_df.iloc[1:]
+    net.nodes_df = net.nodes_df.iloc[1:]
+    assert list(net.get_link_positions_by_model_link_id([10, 12])) == [-1, 0]
+    assert list(net.get_node_positions_by_model_node_id([7, 2])) == [-1, 0]